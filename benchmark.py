@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import click
+import contextlib
+import glob
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gcodeParser import *
+
+
+def bestOf(repeat, func):
+    """Run func repeat times, return best wall time in seconds and last result"""
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def parseQuiet(path):
+    """Parse gcode file, swallowing parser warnings printed to stdout"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return GcodeParser().parseFile(path)
+
+
+def renderQuiet(path, target, views, sizes, **kwargs):
+    """Full gcode2png run (parse, scene, save) for given views and sizes"""
+    # imported here, so parser benchmarks run without mayavi installed
+    from gcode2png import GcodeRenderer
+
+    renderer = GcodeRenderer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        renderer.run(
+            path=path,
+            support=False,
+            moves=False,
+            bed=True,
+            show=False,
+            target=target,
+            imgx=sizes[0][0],
+            imgy=sizes[0][1],
+            views=views,
+            sizes=sizes,
+            **kwargs,
+        )
+    return renderer
+
+
+@click.group()
+def benchmark():
+    """Measure parser and renderer throughput on tests/*.gcode"""
+
+
+@benchmark.command()
+@click.option("--repeat", default=5, help="Runs per file, best time is reported")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def parse(repeat, files):
+    """Parse gcode files and report time, lines/s and segments/s"""
+    files = files or sorted(glob.glob("tests/*.gcode"))
+    for path in files:
+        with open(path, "rb") as f:
+            lines = sum(1 for line in f)
+        elapsed, model = bestOf(repeat, lambda: parseQuiet(path))
+        click.echo(
+            "%-45s %8.3fs %10.0f lines/s %10.0f segments/s"
+            % (path, elapsed, lines / elapsed, len(model.segments) / elapsed)
+        )
+
+
+@benchmark.command()
+@click.option("--repeat", default=5, help="Runs per file, best time is reported")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def estimate(repeat, files):
+    """Print time estimation speed, and estimate next to the slicer's one"""
+    files = files or sorted(glob.glob("tests/*.gcode"))
+    for path in files:
+        arrays = parseQuiet(path).toArrays()
+        elapsed, result = bestOf(repeat, lambda: estimatePrintTime(arrays))
+        click.echo(
+            "%-45s %8.4fs %10.0f segments/s, estimated %6.0fs, slicer %6ss"
+            % (
+                path,
+                elapsed,
+                len(arrays["x"]) / elapsed,
+                result["estimated_time"],
+                readMetadata(path).get("estimated_time", "?"),
+            )
+        )
+
+
+@benchmark.command()
+@click.option("--repeat", default=3, help="Runs per file, best time is reported")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def views(repeat, files):
+    """Compare full render of one image with extra views from the same scene"""
+    files = files or sorted(glob.glob("tests/*.gcode"))
+    views = ["iso", "top", "front"]
+    sizes = [(1600, 1200), (1024, 768), (512, 512), (256, 256)]
+    count = len(views) * len(sizes)
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "view.png")
+        for path in files:
+            single, _ = bestOf(
+                repeat, lambda: renderQuiet(path, target, views[:1], sizes[:1])
+            )
+            multi, _ = bestOf(repeat, lambda: renderQuiet(path, target, views, sizes))
+            click.echo(
+                "%-45s full render %7.3fs, %d views %7.3fs, per extra view %7.3fs"
+                % (path, single, count, multi, (multi - single) / (count - 1))
+            )
+
+
+@benchmark.command()
+@click.option("--frames", default=72, help="Frames per animation")
+@click.option("--format", "ext", default="mp4", help="Target extension, e.g. gif")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def animation(frames, ext, files):
+    """Turntable and build-up animations, reports frames/s including encoding"""
+    files = files or sorted(glob.glob("tests/*.gcode"))
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "animation." + ext)
+        for path in files:
+            for mode in ("turntable", "layers"):
+                start = time.perf_counter()
+                renderer = renderQuiet(
+                    path, target, ["iso"], [(800, 600)], animate=mode, frames=frames
+                )
+                total = time.perf_counter() - start
+                click.echo(
+                    "%-45s %-9s %d frames, total run %7.3fs, %7.1f frames/s streamed"
+                    % (path, mode, frames, total, renderer.animationRate)
+                )
+
+
+@benchmark.command()
+@click.option("--renders", default=5, help="Renders in one process")
+@click.argument("path", type=click.Path(exists=True))
+def latency(renders, path):
+    """Import time and latency of each render in this process, as json"""
+    start = time.perf_counter()
+    import gcode2png
+
+    imported = time.perf_counter() - start
+    times = []
+    for i in range(renders):
+        elapsed, _ = bestOf(
+            1, lambda: renderQuiet(path, None, ["iso"], [(800, 600)], output="array")
+        )
+        times.append(elapsed)
+    click.echo(
+        json.dumps({"backend": gcode2png.BACKEND, "import": imported, "renders": times})
+    )
+
+
+def startXvfb(display=":99"):
+    """Start Xvfb, return process and seconds until its socket accepts clients"""
+    socket = "/tmp/.X11-unix/X" + display[1:]
+    if os.path.exists(socket):
+        raise click.ClickException("display %s is already in use" % display)
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [shutil.which("Xvfb"), display, "-screen", "0", "1024x768x24"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    while not os.path.exists(socket):
+        if server.poll() is not None:
+            raise click.ClickException("Xvfb exited with code %d" % server.returncode)
+        time.sleep(0.005)
+    return server, time.perf_counter() - start
+
+
+@benchmark.command()
+@click.option("--renders", default=5, help="Renders per process, first opens window")
+@click.argument("path", default="tests/2.gcode", type=click.Path(exists=True))
+def startup(renders, path):
+    """Compare OSMesa, EGL and Xvfb backends: server start, import and render latency
+
+    Each backend runs in a fresh process (see latency), the first render
+    creates the render window, the next ones reuse it.
+
+    """
+    for backend in ("osmesa", "egl", "x"):
+        env = dict(os.environ, GCODE2PNG_BACKEND=backend)
+        env.pop("DISPLAY", None)
+        server, serverTime = None, 0.0
+        if backend == "x":
+            if shutil.which("Xvfb") is None:
+                click.echo("%-6s skipped, Xvfb not found" % backend)
+                continue
+            server, serverTime = startXvfb()
+            env["DISPLAY"] = ":99"
+        try:
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, __file__, "latency", "--renders", str(renders), path],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            total = time.perf_counter() - start
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        if result.returncode:
+            error = (result.stderr.strip().splitlines() or ["?"])[-1]
+            click.echo("%-6s failed: %s" % (backend, error))
+            continue
+        stats = json.loads(result.stdout.splitlines()[-1])
+        first, rest = stats["renders"][0], stats["renders"][1:] or [0.0]
+        click.echo(
+            "%-6s server %6.3fs, process %6.3fs, import %6.3fs, first render %6.3fs,"
+            " next renders %6.3fs avg %6.3fs max"
+            % (
+                backend,
+                serverTime,
+                total,
+                stats["import"],
+                first,
+                sum(rest) / len(rest),
+                max(rest),
+            )
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
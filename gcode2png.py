@@ -1,13 +1,31 @@
 import click
+import contextlib
+import io
 import logging
 import math
 import sys
 import os
 import re
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+import offscreen
+
+# OSMesa, EGL or X render window, has to be chosen before mayavi and VTK load
+BACKEND = offscreen.selectBackend()
 
 from mayavi import mlab
 from tvtk.api import tvtk
 
+try:
+    # optional, only needed for WebP output
+    from PIL import Image
+except ImportError:
+    Image = None
+
 from gcodeParser import *
 
 logger = logging.getLogger(__name__)
@@ -22,8 +40,38 @@ logger2.setLevel(level=logging.CRITICAL)
 logger3 = logging.getLogger("mayavi")
 logger3.setLevel(level=logging.CRITICAL)
 
+# in-memory output formats, see GcodeRenderer.encode
+FORMATS = ["png", "jpeg", "webp", "array"]
+# encoded formats written to stdout by the command line, array is for python
+CLI_FORMATS = ["png", "jpeg", "webp"]
+
+# toolpath coloring: type uses flat colors of object, support and moves, the
+# others map per-vertex scalars through a colormap, values are scalar bar titles
+COLOR_BY = {
+    "type": None,
+    "feedrate": "feedrate mm/s",
+    "layer": "layer",
+    "flow": "extrudate mm/mm",
+    "feature": "feature",
+}
+
+# camera views as (azimuth, elevation) in degrees, see mlab.view
+# 225,45 is standard PrusaSlicer preview angle from point 0,0 but way higher, towards the center of the print object
+VIEWS = {
+    "iso": (225, 45),
+    "top": (270, 0),
+    "front": (270, 90),
+    "back": (90, 90),
+    "left": (180, 90),
+    "right": (0, 90),
+}
+
 
 class GcodeRenderer:
+    # offscreen figure shared by all renderers: created once, cleared for each
+    # run, as creating render window and its OpenGL context is slow
+    figure = None
+
     def __init__(self):
         self.imgwidth = 1600
         self.imgheight = 1200
@@ -35,34 +83,32 @@ class GcodeRenderer:
         self.bed = False
 
         self.scene = None
-
-        self.coords = {"object": {}, "moves": {}, "support": {}}
-        self.coords["object"]["x"] = [0]
-        self.coords["object"]["y"] = [0]
-        self.coords["object"]["z"] = [0]
-        self.coords["moves"]["x"] = [0]
-        self.coords["moves"]["y"] = [0]
-        self.coords["moves"]["z"] = [0]
-        self.coords["support"]["x"] = [0]
-        self.coords["support"]["y"] = [0]
-        self.coords["support"]["z"] = [0]
+        self.views = ["iso"]
+        self.sizes = None
+        self.distance = None
+        self.focalpoint = None
+
+        self.colorBy = "type"
+        # coords, plots and toolpath of the current run
+        self.resetToolpaths()
+        # frames/s of last saved animation
+        self.animationRate = None
+        # in-memory images by (view, size), filled when run with output
+        self.images = {}
 
         self.bedsize = [250, 210]  # should match bed_texture.jpg
         black = (0, 0, 0)
         white = (1, 1, 1)
-        red = (1, 0, 0)
         orange = (1, 0.5, 0)
-        lightgrey = (0.7529, 0.7529, 0.7529)
-        blue = (0, 0.4980, 0.9960)
         mediumgrey = (0.7, 0.7, 0.7)
         darkgrey1 = (0.4509, 0.4509, 0.4509)
         darkgrey2 = (0.5490, 0.5490, 0.5490)
 
         self.bgcolor = darkgrey1
-        self.supportcolor = lightgrey
-        self.extrudecolor = red
+        self.supportcolor = GROUP_COLORS["support"]
+        self.extrudecolor = GROUP_COLORS["object"]
         self.bedcolor = mediumgrey
-        self.movecolor = blue
+        self.movecolor = GROUP_COLORS["moves"]
 
         mlab.options.offscreen = True
 
@@ -76,6 +122,15 @@ class GcodeRenderer:
         target: str,
         imgx: int,
         imgy: int,
+        views: list = None,
+        sizes: list = None,
+        animate: str = None,
+        frames: int = 72,
+        fps: int = 24,
+        output: str = None,
+        compression: int = None,
+        quality: int = None,
+        colorBy: str = "type",
     ):
         """Run general processing
 
@@ -88,16 +143,33 @@ class GcodeRenderer:
             target(str): filename to write output image, if set
             imgx(int): image size x to render (pixels)
             imgy(int): image size y to render (pixels)
+            views(list): camera views to save, names from VIEWS, default iso
+            sizes(list): image sizes (x, y) to save for each view, default imgx/imgy
+            animate(str): save target as animation instead of image, turntable or layers
+            frames(int): number of animation frames
+            fps(int): animation frames per second
+            output(str): keep images in memory instead of saving to target, format
+                from FORMATS - encoded bytes or numpy array (array)
+            compression(int): PNG compression level 0-9 for output
+            quality(int): JPEG/WebP quality 1-100 for output
+            colorBy(str): toolpath coloring, name from COLOR_BY
+
+        Returns:
+            dict: in-memory images by (view, size), empty without output
 
         """
         self.path = path
         self.target = target
+        self.images = {}
         self.support = support
         self.moves = moves
         self.bed = bed
         self.imgwidth = imgx
         self.imgheight = imgy
         self.show = show
+        self.views = list(views or ["iso"])
+        self.sizes = list(sizes or [(imgx, imgy)])
+        self.colorBy = colorBy
 
         if self.show:
             mlab.options.offscreen = False
@@ -106,77 +178,111 @@ class GcodeRenderer:
 
         self.createBed()
 
+        self.resetToolpaths()
         self.loadGcode(self.path)
         self.plotModel()
         self.plotMoves()
         self.plotSupport()
+        self.plotToolpaths()
         self.generateScene()
 
-        self.save()
+        if animate:
+            self.animationRate = self.saveAnimation(animate, frames, fps)
+        elif output:
+            self.capture(output, compression, quality)
+        else:
+            self.save()
 
         self.showScene()
 
-        mlab.close(all=True)
-
-    def processSegment(self, segment, target):
-        """Process given gcode segment"""
-
-        logger.debug("segment= %s" % str(segment))
-        m = []
-        # we assume that everything is a move, this is not great but helps
-        # in avoiding specific things to be rendered
-        target = "moves"
-        rule = "undefined"
-
-        if preg_match(r"(custom|wipe)", segment.type, m):
-            target = "moves"
-            rule = "custom"
-
-        elif preg_match(r"(intern|skirt|support)", segment.type, m):
-            target = "support"
-            rule = "support"
-
-        elif preg_match(
-            r"(bridge|external|fill|infill|overhang|perimeter|skin|solid|top|wal)",
-            segment.type,
-            m,
-        ):
-            target = "object"
-            rule = "solid"
-
-        # special treatment for special moves
-        if target == "object":
-            if segment.style in ["fly", "retract"]:
-                target = "moves"
-                rule = "obj_special"
-
-        self.coords[target]["x"].append(segment.coords["X"])
-        self.coords[target]["y"].append(segment.coords["Y"])
-        self.coords[target]["z"].append(segment.coords["Z"])
-        logger.debug("rule: %s, segment assigned to %s" % (rule, target))
+        if self.show:
+            self.closeScene()
+
+        return self.images
+
+    def resetToolpaths(self):
+        """Empty coords and plots, so that renderer can run again"""
+        self.coords = {}
+        for target in ("object", "moves", "support"):
+            # layer index of each point is used for build-up animation, color
+            # scalar of each point, see COLOR_BY
+            self.coords[target] = {
+                axis: [0] for axis in ("x", "y", "z", "layer", "scalar")
+            }
+        # coords targets to plot, all of them go to one polyline actor
+        self.plots = []
+        self.toolpath = None
+        self.toolpathSource = None
 
     def loadGcode(self, path: str):
         """Load gcode to render from given path
 
         Processes gcode file and saves each gcode command to x/y/z action.
+        Toolpath arrays exported by gcodeParser (.npz file or directory) are
+        loaded directly, without parsing.
 
         """
 
         logger.info("loading file %s ..." % path)
-        parser = GcodeParser()
-        model = parser.parseFile(path)
-        logger.info("model.layers=%s ..." % len(model.layers))
+        if path.endswith(".npz") or os.path.isdir(path):
+            arrays = loadArrays(path)
+        else:
+            parser = GcodeParser()
+            model = parser.parseFile(path)
+            logger.info("model.layers=%s ..." % len(model.layers))
+            arrays = model.toArrays()
+
+        targets = segmentGroups(arrays)
+
+        for code in np.unique(arrays["feature"]):
+            logger.debug(
+                "feature='%s' segments=%d"
+                % (FEATURE_NAMES[code], (arrays["feature"] == code).sum())
+            )
 
-        for layer in model.layers:
-            for seg in layer.segments:
-                self.processSegment(seg, seg.style)
+        arrays["scalar"] = self.colorScalars(arrays)
+        for target in self.coords:
+            mask = targets == target
+            for axis in ("x", "y", "z", "layer", "scalar"):
+                self.coords[target][axis].extend(arrays[axis][mask].tolist())
 
         logger.info("done")
 
+    def colorScalars(self, arrays: dict):
+        """Per segment color scalar for self.colorBy, see COLOR_BY"""
+        if self.colorBy == "feedrate":
+            return arrays["f"] / 60.0
+        if self.colorBy == "layer":
+            return arrays["layer"]
+        if self.colorBy == "flow":
+            distance = arrays["distance"]
+            flow = np.zeros(len(distance))
+            np.divide(arrays["extrudate"], distance, out=flow, where=distance > 0)
+            return flow
+        if self.colorBy == "feature":
+            return arrays["feature"]
+        return np.zeros(len(arrays["x"]))
+
     def createScene(self):
         """Create 3D scene in mayavi"""
-        logger.info("creating scene")
-        fig1 = mlab.figure(bgcolor=self.bgcolor, size=(self.imgwidth, self.imgheight))
+        logger.info("creating scene, %s backend" % BACKEND)
+        size = (self.imgwidth, self.imgheight)
+        if not self.show and GcodeRenderer.figure is not None:
+            logger.info("reusing offscreen render window")
+            fig1 = mlab.figure(GcodeRenderer.figure)
+            mlab.clf(fig1)
+            fig1.scene.background = self.bgcolor
+            if tuple(fig1.scene.get_size()) != size:
+                fig1.scene.set_size(size)
+            self.scene = fig1
+            logger.info("done")
+            return
+
+        if self.show and BACKEND != "x":
+            logger.warning("preview window needs X server, set DISPLAY")
+        fig1 = mlab.figure(bgcolor=self.bgcolor, size=size)
+        if not self.show:
+            GcodeRenderer.figure = fig1
         fig1.scene.parallel_projection = False
         fig1.scene.render_window.point_smoothing = False
         fig1.scene.render_window.line_smoothing = False
@@ -187,6 +293,12 @@ class GcodeRenderer:
         self.scene = fig1
         logger.info("done")
 
+    @classmethod
+    def closeScene(cls):
+        """Close all figures, including the shared offscreen one"""
+        mlab.close(all=True)
+        cls.figure = None
+
     def createBed(self):
         """Create bed mesh with a texture"""
         if not self.bed:
@@ -210,7 +322,10 @@ class GcodeRenderer:
             color=self.bedcolor,
         )
 
-        bed_texture = sys.path[0] + "/bed_texture.jpg"
+        # next to this module, also when imported from elsewhere (tests)
+        bed_texture = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "bed_texture.jpg"
+        )
         logger.info("loading bed image %s" % bed_texture)
 
         img = tvtk.JPEGReader(file_name=bed_texture)
@@ -245,19 +360,10 @@ class GcodeRenderer:
                 self.coords["object"]["x"].pop(0)
                 self.coords["object"]["y"].pop(0)
                 self.coords["object"]["z"].pop(0)
+                self.coords["object"]["layer"].pop(0)
+                self.coords["object"]["scalar"].pop(0)
 
-        logger.info("generating model")
-        mlab.plot3d(
-            self.coords["object"]["x"],
-            self.coords["object"]["y"],
-            self.coords["object"]["z"],
-            color=self.extrudecolor,
-            # line_width=2.0,
-            # representation="wireframe",
-            tube_radius=0.5,
-        )
-
-        logger.info("done")
+        self.plots.append("object")
 
     def plotMoves(self):
         """Generate layers defined as moves"""
@@ -278,15 +384,7 @@ class GcodeRenderer:
             logger.info("no moves, nothing to process")
             return
 
-        logger.info("generating moves")
-        mlab.plot3d(
-            self.coords["moves"]["x"],
-            self.coords["moves"]["y"],
-            self.coords["moves"]["z"],
-            color=self.movecolor,
-            tube_radius=0.5,
-        )
-        logger.info("done")
+        self.plots.append("moves")
 
     def plotSupport(self):
         """Generate layers defined as supports"""
@@ -307,14 +405,70 @@ class GcodeRenderer:
             logger.info("no supports, nothing to process")
             return
 
-        logger.info("generating supports")
-        mlab.plot3d(
-            self.coords["support"]["x"],
-            self.coords["support"]["y"],
-            self.coords["support"]["z"],
-            color=self.supportcolor,
-            tube_radius=0.5,
-        )
+        self.plots.append("support")
+
+    def plotToolpaths(self):
+        """Plot object, moves and supports as one polyline tube actor
+
+        Each coords target is one polyline of a single poly data, colored by
+        per-vertex scalars through one lookup table: flat object, support and
+        moves colors for colorBy type, a colormap otherwise.
+
+        """
+        if not self.plots:
+            return
+
+        logger.info("generating toolpaths colored by %s" % self.colorBy)
+        palette = {
+            "object": self.extrudecolor,
+            "support": self.supportcolor,
+            "moves": self.movecolor,
+        }
+        points, scalars, cells = [], [], []
+        offset = 0
+        for index, target in enumerate(self.plots):
+            coords = self.coords[target]
+            for axis in ("x", "y", "z", "layer", "scalar"):
+                coords[axis] = np.asarray(coords[axis])
+            count = len(coords["x"])
+            points.append(np.column_stack([coords["x"], coords["y"], coords["z"]]))
+            if self.colorBy == "type":
+                # one lookup table entry per target, in self.plots order
+                scalars.append(np.full(count, index, dtype=np.float64))
+            else:
+                scalars.append(coords["scalar"].astype(np.float64))
+            cells.append(np.arange(offset - 1, offset + count))
+            cells[-1][0] = count
+            offset += count
+
+        toolpath = tvtk.PolyData(points=np.vstack(points))
+        toolpath.lines = tvtk.CellArray()
+        toolpath.lines.set_cells(len(cells), np.concatenate(cells))
+        toolpath.point_data.scalars = np.concatenate(scalars)
+        toolpath.point_data.scalars.name = self.colorBy
+        self.toolpath = toolpath
+
+        self.toolpathSource = mlab.pipeline.add_dataset(toolpath)
+        tube = mlab.pipeline.tube(self.toolpathSource, tube_radius=0.5, tube_sides=6)
+        if self.colorBy == "type":
+            surface = mlab.pipeline.surface(tube)
+            lut = surface.module_manager.scalar_lut_manager
+            lut.use_default_range = False
+            # lookup table needs 2 colors at least, object alone uses first
+            colors = [palette[target] for target in self.plots]
+            colors += colors[-1:] * (2 - len(colors))
+            lut.data_range = (0, len(colors) - 1)
+            lut.number_of_colors = len(colors)
+            lut.lut.table = np.array(
+                [[c * 255 for c in color] + [255] for color in colors],
+                dtype=np.uint8,
+            )
+        else:
+            colormap = "Paired" if self.colorBy == "feature" else "jet"
+            surface = mlab.pipeline.surface(tube, colormap=colormap)
+            mlab.scalarbar(
+                surface, title=COLOR_BY[self.colorBy], orientation="vertical"
+            )
         logger.info("done")
 
     def generateScene(self):
@@ -348,10 +502,33 @@ class GcodeRenderer:
             + math.pow(dimension_z, 2)
         )
         focalpoint = (obj_pos_x, obj_pos_y, obj_pos_z)
-        # 225,45 is standard PrusaSlicer preview angle from point 0,0 but way higher, towards the center of the print object
-        mlab.view(azimuth=225, elevation=45, distance=distance, focalpoint=focalpoint)
+        self.distance = distance
+        self.focalpoint = focalpoint
+        self.setView(self.views[0])
         logger.info("done")
 
+    def setView(self, view: str):
+        """Point camera at the printed object from given named view"""
+        azimuth, elevation = VIEWS[view]
+        mlab.view(
+            azimuth=azimuth,
+            elevation=elevation,
+            distance=self.distance,
+            focalpoint=self.focalpoint,
+        )
+
+    def viewTarget(self, view: str, size: tuple):
+        """Image filename for given view and size
+
+        With single view and size this is the target itself, otherwise view
+        and size are added before extension, e.g. test.top.512x512.png
+
+        """
+        if len(self.views) == 1 and len(self.sizes) == 1:
+            return self.target
+        base, ext = os.path.splitext(self.target)
+        return "%s.%s.%dx%d%s" % (base, view, size[0], size[1], ext or ".png")
+
     def showScene(self):
         """show 3D scene in mlab as actual interactive window"""
         if not self.show:
@@ -369,43 +546,313 @@ class GcodeRenderer:
             return
 
         logger.info("preparing to save image")
-        img_path = self.target
-        logger.info("mlab.savefig=%s" % img_path)
-        mlab.savefig(img_path)
-        logger.info("img.save=%s" % img_path)
+        # actors are built only once, each view just moves camera and
+        # resizes the render window before saving
+        for size in self.sizes:
+            if tuple(self.scene.scene.get_size()) != tuple(size):
+                self.scene.scene.set_size(size)
+            for view in self.views:
+                self.setView(view)
+                img_path = self.viewTarget(view, size)
+                logger.info("mlab.savefig=%s" % img_path)
+                mlab.savefig(img_path)
+                logger.info("img.save=%s" % img_path)
+        self.setView(self.views[0])
+
+    def framebuffer(self):
+        """Current view as (height, width, 3) uint8 RGB array"""
+        return mlab.screenshot(self.scene, mode="rgb", antialiased=False)
+
+    def encode(self, fmt: str = "png", compression: int = None, quality: int = None):
+        """Encode current view to PNG/JPEG/WebP bytes, without touching disk
+
+        Args:
+            fmt(str): png, jpeg or webp
+            compression(int): PNG compression level 0-9, writer default if not set
+            quality(int): JPEG/WebP quality 1-100, writer default if not set
+
+        """
+        frame = self.framebuffer()
+        if fmt == "webp":
+            if Image is None:
+                raise RuntimeError("WebP output needs Pillow, pip install pillow")
+            buf = io.BytesIO()
+            Image.fromarray(frame).save(buf, "WEBP", quality=quality or 80)
+            return buf.getvalue()
+
+        if fmt == "png":
+            writer = tvtk.PNGWriter(write_to_memory=True)
+            if compression is not None:
+                writer.compression_level = compression
+        elif fmt == "jpeg":
+            writer = tvtk.JPEGWriter(write_to_memory=True)
+            if quality is not None:
+                writer.quality = quality
+        else:
+            raise ValueError("unsupported image format '%s'" % fmt)
+
+        # vtk images start at bottom left
+        height, width = frame.shape[:2]
+        image = tvtk.ImageData(dimensions=(width, height, 1))
+        image.point_data.scalars = np.flipud(frame).reshape(-1, 3)
+        image.point_data.scalars.name = "rgb"
+        writer.set_input_data(image)
+        writer.write()
+        return writer.result.to_array().tobytes()
+
+    def capture(self, fmt: str, compression: int = None, quality: int = None):
+        """Keep each view and size in self.images, as bytes or array (fmt array)"""
+        logger.info("capturing %s images" % fmt)
+        self.images = {}
+        for size in self.sizes:
+            if tuple(self.scene.scene.get_size()) != tuple(size):
+                self.scene.scene.set_size(size)
+            for view in self.views:
+                self.setView(view)
+                if fmt == "array":
+                    image = self.framebuffer()
+                else:
+                    image = self.encode(fmt, compression, quality)
+                self.images[(view, tuple(size))] = image
+        self.setView(self.views[0])
+        logger.info("done")
+        return self.images
+
+    def showLayers(self, maxLayer):
+        """Limit plotted toolpaths to layers up to maxLayer"""
+        cells = []
+        offset = 0
+        for target in self.plots:
+            layers = self.coords[target]["layer"]
+            # layers are not always ascending, e.g. raft layers are negative
+            mask = layers <= maxLayer
+            if mask.sum() < 2:
+                # keep at least first segment as a line
+                mask[:2] = True
+            points = np.flatnonzero(mask) + offset
+            cells.append(np.concatenate([[len(points)], points]))
+            offset += len(layers)
+        self.toolpath.lines.set_cells(len(cells), np.concatenate(cells))
+        self.toolpath.modified()
+        self.toolpathSource.update()
+
+    def openEncoder(self, frame: np.ndarray, fps: int):
+        """Start ffmpeg reading raw RGB frames of given shape from stdin
+
+        Output format is taken from target extension: .gif, .png/.apng
+        (animated PNG) or any video container ffmpeg knows, e.g. .mp4, .webm.
+
+        """
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found, it is required for animations")
+
+        height, width = frame.shape[:2]
+        ext = os.path.splitext(self.target)[1].lower()
+        # raw frames in, nothing is written to disk besides the target
+        cmd = [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo"]
+        cmd += ["-pix_fmt", "rgb24", "-s", "%dx%d" % (width, height)]
+        cmd += ["-r", str(fps), "-i", "-"]
+        if ext == ".gif":
+            cmd += ["-vf", "split[a][b];[a]palettegen[p];[b][p]paletteuse"]
+            cmd += ["-loop", "0"]
+        elif ext in (".png", ".apng"):
+            cmd += ["-f", "apng", "-plays", "0"]
+        else:
+            # most video codecs need even dimensions
+            cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p"]
+        cmd.append(self.target)
+        logger.info("encoder=%s" % " ".join(cmd))
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def saveAnimation(self, mode: str, frames: int, fps: int):
+        """Save animation of the scene to target, streaming frames to ffmpeg
+
+        Scene is built only once, each frame either rotates camera around the
+        object (turntable) or shows one more part of the layers (layers).
+
+        Returns rendered frames per second.
+
+        """
+        if not self.target:
+            logger.info("skipping saving animation")
+            return None
+
+        logger.info("saving %s animation, %d frames" % (mode, frames))
+        layers = np.asarray(self.coords["object"]["layer"])
+        azimuth, elevation = VIEWS[self.views[0]]
+
+        encoder = None
+        start = time.perf_counter()
+        try:
+            for i in range(frames):
+                if mode == "turntable":
+                    mlab.view(
+                        azimuth=(azimuth + 360.0 * i / frames) % 360,
+                        elevation=elevation,
+                        distance=self.distance,
+                        focalpoint=self.focalpoint,
+                    )
+                else:
+                    self.showLayers(
+                        layers.min() + (layers.max() - layers.min()) * (i + 1) / frames
+                    )
+                # framebuffer as (height, width, 3) uint8 array, no file involved
+                frame = self.framebuffer()
+                if encoder is None:
+                    encoder = self.openEncoder(frame, fps)
+                try:
+                    encoder.stdin.write(np.ascontiguousarray(frame).tobytes())
+                except BrokenPipeError:
+                    # ffmpeg exited early, its exit code is reported below
+                    break
+        finally:
+            if encoder is not None:
+                try:
+                    encoder.stdin.close()
+                except BrokenPipeError:
+                    pass
+                encoder.wait()
+
+        if encoder is not None and encoder.returncode:
+            raise RuntimeError("ffmpeg failed with exit code %d" % encoder.returncode)
+        elapsed = time.perf_counter() - start
+        rate = frames / elapsed if elapsed else 0.0
+        logger.info(
+            "saved %s, %d frames in %.2fs, %.1f frames/s"
+            % (self.target, frames, elapsed, rate)
+        )
+        return rate
 
 
 @click.command()
 @click.option("--bed", default=True, help="Show bed")
 @click.option("--supports", default=False, help="Show supports")
 @click.option("--moves", default=False, help="Show moves")
+@click.option(
+    "--color-by",
+    "colorBy",
+    type=click.Choice(list(COLOR_BY)),
+    default="type",
+    help="Toolpath colors: flat by type, or heatmap of feedrate, layer, flow, feature",
+)
 @click.option("--show", default=False, help="Show preview window")
 @click.option("--imgx", default=1600, help="Saved image X in pixels")
 @click.option("--imgy", default=1200, help="Saved image Y in pixels")
+@click.option(
+    "--view",
+    "views",
+    multiple=True,
+    type=click.Choice(list(VIEWS)),
+    help="Camera view to save, can be repeated (default iso)",
+)
+@click.option(
+    "--size",
+    "sizes",
+    multiple=True,
+    help="Image size WxH to save for each view, can be repeated (default imgx x imgy)",
+)
+@click.option(
+    "--animate",
+    type=click.Choice(["turntable", "layers"]),
+    help="Save target as animation (.mp4, .webm, .gif, .png), needs ffmpeg",
+)
+@click.option(
+    "--frames", default=72, type=click.IntRange(min=1), help="Animation frames"
+)
+@click.option("--fps", default=24, help="Animation frames per second")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(CLI_FORMATS),
+    default="png",
+    help="Image format when target is - (stdout)",
+)
+@click.option("--compression", type=click.IntRange(0, 9), help="PNG compression")
+@click.option("--quality", type=click.IntRange(1, 100), help="JPEG/WebP quality")
 @click.argument("source", type=click.Path(exists=True))
-@click.argument("target", type=click.Path(), required=False)
-def gcode2png(source, bed, supports, moves, show, target, imgx, imgy):
+@click.argument("target", type=click.Path(allow_dash=True), required=False)
+def gcode2png(
+    source,
+    bed,
+    supports,
+    moves,
+    show,
+    target,
+    imgx,
+    imgy,
+    views,
+    sizes,
+    animate,
+    frames,
+    fps,
+    fmt,
+    compression,
+    quality,
+    colorBy,
+):
     """Process input filename and based on file name create PNG file
 
     Example input is test.gcode, then output will be test.png
 
+    With more views or sizes each image gets view and size in its name,
+    e.g. test.top.512x512.png, all rendered from one scene.
+
+    Target - writes single encoded image to stdout, e.g. for pipes.
+
     Output will be overwritten, if exists.
 
     """
 
+    try:
+        sizes = [tuple(int(v) for v in size.lower().split("x")) for size in sizes]
+    except ValueError:
+        sizes = [()]
+    if any(len(size) != 2 for size in sizes):
+        raise click.BadParameter("expected WxH, e.g. 512x512", param_hint="--size")
+    if sizes:
+        # scene is created with the first size, render window is resized for others
+        imgx, imgy = sizes[0]
+
+    stdout = target == "-"
+    if stdout and (animate or len(views) > 1 or len(sizes) > 1):
+        raise click.BadParameter(
+            "stdout takes a single image, no animation or more views/sizes",
+            param_hint="target",
+        )
+    if stdout and fmt == "webp" and Image is None:
+        raise click.BadParameter(
+            "WebP output needs Pillow, pip install pillow", param_hint="--format"
+        )
+
     renderer = GcodeRenderer()
-    if target is not None:
+    if target is not None and not stdout:
         target = click.format_filename(target)
-    renderer.run(
-        path=source,
-        support=supports,
-        moves=moves,
-        bed=bed,
-        show=show,
-        target=target,
-        imgx=imgx,
-        imgy=imgy,
-    )
+    # keep stdout clean for image data, parser warnings go to stderr
+    with contextlib.redirect_stdout(sys.stderr if stdout else sys.stdout):
+        images = renderer.run(
+            path=source,
+            support=supports,
+            moves=moves,
+            bed=bed,
+            show=show,
+            target=None if stdout else target,
+            imgx=imgx,
+            imgy=imgy,
+            views=views,
+            sizes=sizes,
+            animate=animate,
+            frames=frames,
+            fps=fps,
+            output=fmt if stdout else None,
+            compression=compression,
+            quality=quality,
+            colorBy=colorBy,
+        )
+    if stdout:
+        for image in images.values():
+            sys.stdout.buffer.write(image)
+        sys.stdout.buffer.flush()
 
 
 if __name__ == "__main__":
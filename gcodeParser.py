@@ -1,5 +1,9 @@
+import json
 import math
+import os
 import re
+import struct
+import sys
 import numpy as np
 
 
@@ -13,12 +17,161 @@ def preg_match(rex, s, m, opts={}):
     return False
 
 
+# all comments understood by the parser, matched once per comment line:
+# ;TYPE:Perimeter (Cura, PrusaSlicer), ; FEATURE: Outer wall (OrcaSlicer),
+# ; feature outer perimeter (Simplify3D), ; skirt (older slicers, keyword only),
+# ;LAYER_COUNT:62 and ;LAYER:0 (Cura)
+COMMENT_RE = re.compile(
+    r"\s*(?:"
+    r"(?:TYPE|FEATURE):\s*(?P<type>[^;]+)"
+    r"|feature\s+(?P<feature>[^;]+)"
+    r"|(?P<legacy>skirt|perimeter|infill|support)\s*$"
+    r"|(?P<count>LAYER_COUNT:)"
+    r"|LAYER:\s*(?P<layer>-?\d+)"
+    r")"
+)
+ROUND_COMMENT_RE = re.compile(r"\([^)]*\)")
+
+# args given in current units (G20/G21), converted to millimeters by parseArgs
+UNIT_ARGS = ("X", "Y", "Z", "E", "F", "I", "J")
+INCH = 25.4
+
+# codes without effect on the toolpath, accepted without a warning
+IGNORED_CODES = (
+    "G29",  # bed leveling
+    "G80",  # mesh bed leveling
+    "M17",  # enable steppers
+    "M18",  # disable steppers
+    "M73",  # print progress
+    "M84",  # disable steppers
+    "M92",  # steps per unit
+    "M104",  # hotend temperature
+    "M105",  # report temperature
+    "M106",  # fan on
+    "M107",  # fan off
+    "M109",  # wait for hotend temperature
+    "M115",  # firmware info
+    "M117",  # display message
+    "M140",  # bed temperature
+    "M190",  # wait for bed temperature
+    "M220",  # feedrate percentage
+    "M221",  # flow percentage
+    "M400",  # wait for moves to finish
+    "M569",  # stepper driver mode
+    "M862.3",  # printer model check
+    "M900",  # linear advance
+)
+
+# motion limits (Marlin defaults), changed by M201, M203, M204 and M205
+DEFAULT_LIMITS = {
+    "max_feedrate": (300.0, 300.0, 5.0, 25.0),  # X, Y, Z, E in mm/s (M203)
+    "max_accel": (3000.0, 3000.0, 100.0, 10000.0),  # X, Y, Z, E in mm/s^2 (M201)
+    "accel_print": 3000.0,  # mm/s^2 (M204 P or S)
+    "accel_retract": 3000.0,  # mm/s^2 (M204 R)
+    "accel_travel": 3000.0,  # mm/s^2 (M204 T or S)
+    "jerk": (10.0, 10.0, 0.3, 5.0),  # X, Y, Z, E in mm/s (M205)
+    "junction_deviation": 0.013,  # mm (M205 J)
+    "classic_jerk": False,  # jerk instead of junction deviation, set by M205 X/Y
+}
+# feedrate of moves before the first F, Marlin default (mm/s)
+DEFAULT_FEEDRATE = 25.0
+
+# feature type rules, evaluated once per distinct feature name (see internFeature)
+FEATURE_MOVES_RE = re.compile(r"custom|wipe")
+FEATURE_SUPPORT_RE = re.compile(r"intern|skirt|support")
+FEATURE_OBJECT_RE = re.compile(
+    r"bridge|external|fill|infill|overhang|perimeter|skin|solid|top|wal"
+)
+
+# feature types interned to small integer codes, code 0 means no type was given
+FEATURE_NONE = 0
+FEATURE_NAMES = [""]  # code -> feature name (lowercase, as given by the slicer)
+FEATURE_GROUPS = ["moves"]  # code -> render group: object, support or moves
+FEATURE_CODES = {"": FEATURE_NONE}  # feature name -> code
+
+# segment styles set by classifySegments, codes are used in toolpath arrays
+STYLE_NAMES = ["fly", "retract", "restore", "extrude"]
+STYLE_CODES = {name: code for code, name in enumerate(STYLE_NAMES)}
+# M204 acceleration used for each segment style
+ACCEL_LIMITS = {
+    "fly": "accel_travel",
+    "retract": "accel_retract",
+    "restore": "accel_retract",
+    "extrude": "accel_print",
+}
+
+# version of toolpath arrays written by GcodeModel.exportArrays
+ARRAYS_VERSION = 2
+
+# RGB colors of render groups, used by gcode2png and glTF export
+GROUP_COLORS = {
+    "object": (1.0, 0.0, 0.0),
+    "support": (0.7529, 0.7529, 0.7529),
+    "moves": (0.0, 0.4980, 0.9960),
+}
+
+
+def classifyFeature(name):
+    """Return render group (object, support or moves) for feature name"""
+    if FEATURE_MOVES_RE.search(name):
+        return "moves"
+    if FEATURE_SUPPORT_RE.search(name):
+        return "support"
+    if FEATURE_OBJECT_RE.search(name):
+        return "object"
+    # we assume that everything else is a move, this is not great but helps
+    # in avoiding specific things to be rendered
+    return "moves"
+
+
+def internFeature(name):
+    """Return integer code for feature name, registering new names on first use"""
+    name = name.strip().lower()
+    code = FEATURE_CODES.get(name)
+    if code is None:
+        code = len(FEATURE_NAMES)
+        FEATURE_NAMES.append(name)
+        FEATURE_GROUPS.append(classifyFeature(name))
+        FEATURE_CODES[name] = code
+    return code
+
+
+def segmentGroups(arrays):
+    """Render group (object, support or moves) of each segment of toolpath arrays
+
+    Groups of feature types were classified once, when their names were
+    interned. Files without any feature type are all object. Object segments
+    that do not extrude (fly, retract) are moves.
+
+    """
+    if arrays["feature"].any():
+        groups = np.array(FEATURE_GROUPS)[arrays["feature"]]
+    else:
+        groups = np.full(len(arrays["feature"]), "object", dtype="<U7")
+    special = np.isin(arrays["style"], [STYLE_CODES["fly"], STYLE_CODES["retract"]])
+    groups[(groups == "object") & special] = "moves"
+    return groups
+
+
 class GcodeParser:
-    def __init__(self):
+    def __init__(self, firmware="marlin"):
         self.model = GcodeModel(self)
+        # G90/G91 also set extruder mode in marlin (and Prusa) firmware, but
+        # not in reprap (RepRapFirmware) or klipper
+        self.firmware = firmware
         self.current_type = None
+        self.current_feature = FEATURE_NONE
         self.layer_count = None
         self.layer_current = None
+        # millimeters per unit of parsed args, changed by G20/G21
+        self.units = 1.0
+        # dispatch table of known codes, e.g. 'G1' -> self.parse_G1
+        self.commands = {
+            name[len("parse_") :]: getattr(self, name)
+            for name in dir(self)
+            if name.startswith("parse_")
+        }
+        self.commands.update(dict.fromkeys(IGNORED_CODES, self.parse_ignored))
 
     def parseFile(self, path):
         # read the gcode file
@@ -40,24 +193,24 @@ class GcodeParser:
     def parseLine(self):
         # strip comments:
         ## first handle round brackets
-        command = re.sub("\([^)]*\)", "", self.line)
+        command = self.line
+        if "(" in command:
+            command = ROUND_COMMENT_RE.sub("", command)
         ## then semicolons
         idx = command.find(";")
         if idx >= 0:  # -- any comment to parse?
-            m = []
-            if preg_match(r"TYPE:\s*(\w+)", command, m):
-                self.current_type = m[1].lower()
-            elif preg_match(r"; (skirt|perimeter|infill|support)", command, m):
-                self.current_type = m[1]
-            elif not self.layer_count and re.search(r"LAYER_COUNT:", command):
-                self.layer_count = 1
-            elif preg_match(
-                r"LAYER:\s*(\d+)", command, m
-            ):  # -- we have actual LAYER: counter! let's use it
-                self.layer_count = 1
-                self.layer_current = int(m[1])
-            # elif preg_match(r'; (\w+):\s*"?(\d+)"?',command,m):
-            # 	self.metadata[m[1]] = m[2]
+            m = COMMENT_RE.match(command, idx + 1)
+            if m:
+                kind = m.lastgroup
+                if kind == "layer":
+                    # -- we have actual LAYER: counter! let's use it
+                    self.layer_count = 1
+                    self.layer_current = int(m.group("layer"))
+                elif kind == "count":
+                    self.layer_count = 1
+                else:
+                    self.current_type = m.group(kind).strip().lower()
+                    self.current_feature = internFeature(self.current_type)
             command = command[0:idx].strip()
         ## detect unterminated round bracket comments, just in case
         idx = command.find("(")
@@ -73,8 +226,12 @@ class GcodeParser:
         args = comm[1] if (len(comm) > 1) else None
 
         if code:
-            if hasattr(self, "parse_" + code):
-                getattr(self, "parse_" + code)(args)
+            handler = self.commands.get(code)
+            if handler is not None:
+                handler(args)
+            elif code[0] == "T" and code[1:].isdigit():
+                # Tn: Select tool
+                self.model.setTool(int(code[1:]))
             else:
                 self.warn("Unknown code '%s'" % code)
 
@@ -89,6 +246,10 @@ class GcodeParser:
                 except ValueError:
                     coord = 1
                 dic[letter] = coord
+            if self.units != 1.0:
+                for letter in dic:
+                    if letter in UNIT_ARGS:
+                        dic[letter] *= self.units
         return dic
 
     def parse_G0(self, args):
@@ -98,33 +259,28 @@ class GcodeParser:
 
     def parse_G1(self, args, type="G1"):
         # G1: Controlled move
-        self.model.do_G1(
-            self.parseArgs(args),
-            type + (":" + self.current_type if self.current_type else ""),
-        )
+        self.model.do_G1(self.parseArgs(args), type)
 
     def parse_G2(self, args, type="G2"):
         # G2: Arc move
-        self.model.do_G2(
-            self.parseArgs(args),
-            type + (":" + self.current_type if self.current_type else ""),
-        )
+        self.model.do_G2(self.parseArgs(args), type)
 
     def parse_G3(self, args, type="G3"):
         # G3: Arc move
-        self.model.do_G2(
-            self.parseArgs(args),
-            type + (":" + self.current_type if self.current_type else ""),
-        )
+        self.model.do_G2(self.parseArgs(args), type)
+
+    def parse_G4(self, args):
+        # G4: Dwell, P in milliseconds or S in seconds
+        args = self.parseArgs(args)
+        self.model.addDwell(args.get("P", 0.0) / 1000.0 + args.get("S", 0.0))
 
     def parse_G20(self, args):
         # G20: Set Units to Inches
-        self.error("Unsupported & incompatible: G20: Set Units to Inches")
+        self.units = INCH
 
     def parse_G21(self, args):
         # G21: Set Units to Millimeters
-        # Default, nothing to do
-        pass
+        self.units = 1.0
 
     def parse_G28(self, args):
         # G28: Move to Origin
@@ -133,15 +289,72 @@ class GcodeParser:
     def parse_G90(self, args):
         # G90: Set to Absolute Positioning
         self.model.setRelative(False)
+        if self.firmware == "marlin":
+            self.model.setRelativeExtrusion(False)
 
     def parse_G91(self, args):
         # G91: Set to Relative Positioning
         self.model.setRelative(True)
+        if self.firmware == "marlin":
+            self.model.setRelativeExtrusion(True)
 
     def parse_G92(self, args):
         # G92: Set Position
         self.model.do_G92(self.parseArgs(args))
 
+    def parse_ignored(self, args):
+        # known code, nothing to do
+        pass
+
+    def parse_M82(self, args):
+        # M82: Set Extruder to Absolute Mode
+        self.model.setRelativeExtrusion(False)
+
+    def parse_M83(self, args):
+        # M83: Set Extruder to Relative Mode
+        self.model.setRelativeExtrusion(True)
+
+    def parse_M201(self, args):
+        # M201: Set Max Acceleration per axis
+        self.model.setLimits(max_accel=self.axisLimits("max_accel", args))
+
+    def parse_M203(self, args):
+        # M203: Set Max Feedrate per axis
+        self.model.setLimits(max_feedrate=self.axisLimits("max_feedrate", args))
+
+    def parse_M204(self, args):
+        # M204: Set Default Acceleration, S sets both print and travel
+        args = self.parseArgs(args)
+        limits = {}
+        if "S" in args:
+            limits["accel_print"] = limits["accel_travel"] = args["S"]
+        if "P" in args:
+            limits["accel_print"] = args["P"]
+        if "R" in args:
+            limits["accel_retract"] = args["R"]
+        if "T" in args:
+            limits["accel_travel"] = args["T"]
+        self.model.setLimits(**limits)
+
+    def parse_M205(self, args):
+        # M205: Set Advanced Settings, X/Y/Z/E jerk or J junction deviation
+        limits = {"jerk": self.axisLimits("jerk", args)}
+        args = self.parseArgs(args)
+        if "X" in args or "Y" in args:
+            limits["classic_jerk"] = True
+        if "J" in args:
+            limits["junction_deviation"] = args["J"]
+            limits["classic_jerk"] = False
+        self.model.setLimits(**limits)
+
+    def axisLimits(self, name, args):
+        # per axis (X, Y, Z, E) limit from args, axes not given keep their value
+        args = self.parseArgs(args)
+        return tuple(
+            args.get(axis, value)
+            for axis, value in zip("XYZE", self.model.limits[name])
+        )
+
     def warn(self, msg):
         print("[WARN] Line %d: %s (Text:'%s')" % (self.lineNb, msg, self.line))
 
@@ -177,12 +390,20 @@ class BBox(object):
         return (self.zmax + self.zmin) / 2
 
     def extend(self, coords):
-        self.xmin = min(self.xmin, coords["X"])
-        self.xmax = max(self.xmax, coords["X"])
-        self.ymin = min(self.ymin, coords["Y"])
-        self.ymax = max(self.ymax, coords["Y"])
-        self.zmin = min(self.zmin, coords["Z"])
-        self.zmax = max(self.zmax, coords["Z"])
+        # plain comparisons, min()/max() calls are noticeably slower here
+        x, y, z = coords["X"], coords["Y"], coords["Z"]
+        if x < self.xmin:
+            self.xmin = x
+        elif x > self.xmax:
+            self.xmax = x
+        if y < self.ymin:
+            self.ymin = y
+        elif y > self.ymax:
+            self.ymax = y
+        if z < self.zmin:
+            self.zmin = z
+        elif z > self.zmax:
+            self.zmax = z
 
 
 class GcodeModel:
@@ -203,6 +424,12 @@ class GcodeModel:
         self.offset = {"X": 0.0, "Y": 0.0, "Z": 0.0, "E": 0.0}
         # if true, args for move (G1) are given relatively (default: absolute)
         self.isRelative = False
+        # if true, E for move is given relatively even in absolute positioning (M83)
+        self.isRelativeE = False
+        # active tool (Tn)
+        self.tool = 0
+        # motion limits, replaced (not modified) on change, segments keep theirs
+        self.limits = DEFAULT_LIMITS
         # the segments
         self.segments = []
         self.layers = None
@@ -210,43 +437,47 @@ class GcodeModel:
         self.extrudate = None
         self.bbox = None
 
-    def do_G1(self, args, type):
-        # G0/G1: Rapid/Controlled move
+    def moveCoords(self, args):
         # clone previous coords
         coords = dict(self.relative)
+        # arc center offsets are not modal
+        coords["I"] = coords["J"] = 0.0
         # update changed coords
-        for axis in args.keys():
-            if axis in coords:
-                if self.isRelative:
-                    coords[axis] += args[axis]
-                else:
-                    coords[axis] = args[axis]
-            else:
+        for axis, value in args.items():
+            if axis not in coords:
                 self.warn("Unknown axis '%s'" % axis)
-        # build segment
-        absolute = {
-            "X": self.offset["X"] + coords["X"],
-            "Y": self.offset["Y"] + coords["Y"],
-            "Z": self.offset["Z"] + coords["Z"],
+            elif axis in ("F", "I", "J"):
+                coords[axis] = value
+            elif self.isRelative or (axis == "E" and self.isRelativeE):
+                coords[axis] += value
+            else:
+                coords[axis] = value
+        return coords
+
+    def toAbsolute(self, coords):
+        offset = self.offset
+        return {
+            "X": offset["X"] + coords["X"],
+            "Y": offset["Y"] + coords["Y"],
+            "Z": offset["Z"] + coords["Z"],
             "F": coords["F"],  # no feedrate offset
-            "E": self.offset["E"] + coords["E"],
+            "E": offset["E"] + coords["E"],
         }
-        seg = Segment(type, absolute, self.parser.lineNb, self.parser.line)
+
+    def do_G1(self, args, type):
+        # G0/G1: Rapid/Controlled move
+        coords = self.moveCoords(args)
+        # build segment
+        seg = Segment(
+            type, self.toAbsolute(coords), self.parser.lineNb, self.parser.line
+        )
         self.addSegment(seg)
         # update model coords
         self.relative = coords
 
     def do_G2(self, args, type):
         # G2 & G3: Arc move
-        coords = dict(self.relative)  # -- clone previous coords
-        for axis in args.keys():  # -- update changed coords
-            if axis in coords:
-                if self.isRelative:
-                    coords[axis] += args[axis]
-                else:
-                    coords[axis] = args[axis]
-            else:
-                self.warn("Unknown axis '%s'" % axis)
+        coords = self.moveCoords(args)  # -- clone previous coords
         # -- self.relative (current pos), coords (new pos)
         dir = 1  # -- ccw is angle positive
         if type.find("G2") == 0:
@@ -270,31 +501,36 @@ class GcodeModel:
             if as_ < ae_:
                 as_ += math.pi * 2
             al = abs(ae_ - as_) * dir
-        n = int(abs(al) * da / 0.5)
+        # -- at least one segment, so tiny arcs still reach the end point
+        n = max(int(abs(al) * da / 0.5), 1)
         # if coords['Z']<0.4 or coords['Z']==2.3: print(type,dir,n,np.degrees(as_),np.degrees(ae_),al,coords['Z'],"\n",self.relative,"\n",args)
-        if n > 0:
-            for i in range(1, n + 1):
-                f = i / n
-                # print(i,f,n)
-                a = as_ + al * f
-                coords["X"] = xp + math.cos(a) * da
-                coords["Y"] = yp + math.sin(a) * da
-                coords["E"] = es + ep * f
-                absolute = {
-                    "X": self.offset["X"] + coords["X"],
-                    "Y": self.offset["Y"] + coords["Y"],
-                    "Z": self.offset["Z"] + coords["Z"],
-                    "F": coords["F"],  # no feedrate offset
-                    "E": self.offset["E"] + coords["E"],
-                }
-                seg = Segment(type, absolute, self.parser.lineNb, self.parser.line)
-                self.addSegment(seg)
-                # update model coords
-                self.relative = coords
+        for i in range(1, n + 1):
+            f = i / n
+            # print(i,f,n)
+            a = as_ + al * f
+            coords["X"] = xp + math.cos(a) * da
+            coords["Y"] = yp + math.sin(a) * da
+            coords["E"] = es + ep * f
+            seg = Segment(
+                type, self.toAbsolute(coords), self.parser.lineNb, self.parser.line
+            )
+            self.addSegment(seg)
+            # update model coords
+            self.relative = coords
 
     def do_G28(self, args):
         # G28: Move to Origin
-        self.warn("G28 unimplemented")
+        # given axes (all, if none given) move to 0, which also drops their G92 offsets
+        axes = [axis for axis in ("X", "Y", "Z") if axis in args] or ["X", "Y", "Z"]
+        coords = dict(self.relative)
+        for axis in axes:
+            self.offset[axis] = 0.0
+            coords[axis] = 0.0
+        seg = Segment(
+            "G28", self.toAbsolute(coords), self.parser.lineNb, self.parser.line
+        )
+        self.addSegment(seg)
+        self.relative = coords
 
     def do_G92(self, args):
         # G92: Set Position
@@ -315,7 +551,25 @@ class GcodeModel:
     def setRelative(self, isRelative):
         self.isRelative = isRelative
 
+    def setRelativeExtrusion(self, isRelativeE):
+        # M82/M83, and G90/G91 with marlin firmware (see GcodeParser)
+        self.isRelativeE = isRelativeE
+
+    def setTool(self, tool):
+        self.tool = tool
+
+    def setLimits(self, **limits):
+        self.limits = dict(self.limits, **limits)
+
+    def addDwell(self, seconds):
+        # dwell is added to the time of the last move
+        if self.segments:
+            self.segments[-1].dwell += seconds
+
     def addSegment(self, segment):
+        segment.feature = self.parser.current_feature
+        segment.tool = self.tool
+        segment.limits = self.limits
         if self.parser.layer_count:
             segment.layerIdx = self.parser.layer_current
         self.segments.append(segment)
@@ -470,6 +724,207 @@ class GcodeModel:
         self.splitLayers()
         self.calcMetrics()
 
+    def toArrays(self):
+        """Columnar toolpath, one numpy array per column
+
+        Segment columns (one row per segment, in layer order): x, y, z, f (end
+        point and feedrate), e (absolute extruder position), distance,
+        extrudate, feature (code into feature_names), style (code into
+        STYLE_NAMES), tool, layer (layerIdx), line (gcode line number), accel
+        (M204 acceleration for the style of move) and dwell (G4 seconds after
+        the move).
+
+        Layer columns: layer_offsets (first segment of each layer, plus total
+        count), layer_z, layer_distance, layer_extrudate and layer_bbox
+        (xmin, xmax, ymin, ymax, zmin, zmax).
+
+        Motion limits at the end of the file: max_feedrate, max_accel and jerk
+        (X, Y, Z, E), junction_deviation and classic_jerk, see DEFAULT_LIMITS.
+
+        """
+        segments = [seg for layer in self.layers for seg in layer.segments]
+        coords = np.array(
+            [
+                (
+                    s.coords["X"],
+                    s.coords["Y"],
+                    s.coords["Z"],
+                    s.coords["F"],
+                    s.coords["E"],
+                    s.distance,
+                    s.extrudate,
+                    s.limits[ACCEL_LIMITS[s.style]],
+                    s.dwell,
+                )
+                for s in segments
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 9)
+        codes = np.array(
+            [
+                (
+                    s.feature,
+                    STYLE_CODES[s.style],
+                    s.tool,
+                    s.layerIdx or 0,
+                    s.lineNb,
+                )
+                for s in segments
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 5)
+
+        def bbox(b):
+            if b is None:
+                return (np.nan,) * 6
+            return (b.xmin, b.xmax, b.ymin, b.ymax, b.zmin, b.zmax)
+
+        offsets = np.zeros(len(self.layers) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(layer.segments) for layer in self.layers])
+
+        return {
+            "version": np.array(ARRAYS_VERSION),
+            "x": coords[:, 0],
+            "y": coords[:, 1],
+            "z": coords[:, 2],
+            "f": coords[:, 3].astype(np.float32),
+            "e": coords[:, 4],
+            "distance": coords[:, 5],
+            "extrudate": coords[:, 6],
+            "feature": codes[:, 0].astype(np.uint16),
+            "style": codes[:, 1].astype(np.uint8),
+            "tool": codes[:, 2].astype(np.uint8),
+            "layer": codes[:, 3].astype(np.int32),
+            "line": codes[:, 4].astype(np.int32),
+            "accel": coords[:, 7].astype(np.float32),
+            "dwell": coords[:, 8].astype(np.float32),
+            "feature_names": np.array(FEATURE_NAMES),
+            "layer_offsets": offsets,
+            "layer_z": np.array([layer.Z for layer in self.layers], dtype=np.float64),
+            "layer_distance": np.array(
+                [layer.distance for layer in self.layers], dtype=np.float64
+            ),
+            "layer_extrudate": np.array(
+                [layer.extrudate for layer in self.layers], dtype=np.float64
+            ),
+            "layer_bbox": np.array(
+                [bbox(layer.bbox) for layer in self.layers], dtype=np.float64
+            ).reshape(-1, 6),
+            "distance_total": np.array(self.distance),
+            "extrudate_total": np.array(self.extrudate),
+            "bbox": np.array(bbox(self.bbox)),
+            "max_feedrate": np.array(self.limits["max_feedrate"], dtype=np.float64),
+            "max_accel": np.array(self.limits["max_accel"], dtype=np.float64),
+            "jerk": np.array(self.limits["jerk"], dtype=np.float64),
+            "junction_deviation": np.array(self.limits["junction_deviation"]),
+            "classic_jerk": np.array(self.limits["classic_jerk"]),
+        }
+
+    def exportArrays(self, path):
+        """Save toolpath arrays, see toArrays
+
+        Path ending with .npz is a single compressed file, any other path is
+        a directory with one .npy file per column, which loadArrays can
+        memory map.
+
+        """
+        arrays = self.toArrays()
+        if path.endswith(".npz"):
+            np.savez_compressed(path, **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), array)
+
+    def exportGltf(self, path, moves=False):
+        """Save toolpath as binary glTF (.glb) line mesh, for web viewers
+
+        One LINES primitive per render group (object, support and, if moves
+        is set, moves), see segmentGroups. Coordinates are scaled to meters and
+        rotated to glTF Y-up.
+
+        """
+        arrays = self.toArrays()
+        end = np.stack([arrays["x"], arrays["y"], arrays["z"]], axis=1)
+        end = end.astype(np.float32)
+        # segments start where previous one ended, model starts at origin
+        start = np.vstack([np.zeros((1, 3), dtype=np.float32), end[:-1]])
+
+        groups = segmentGroups(arrays)
+
+        binary = b""
+        gltf = {
+            "asset": {"version": "2.0", "generator": "gcode2png"},
+            "scene": 0,
+            "scenes": [{"nodes": [0]}],
+            # gcode is Z-up millimeters, glTF is Y-up meters
+            "nodes": [
+                {
+                    "mesh": 0,
+                    "rotation": [-math.sqrt(0.5), 0.0, 0.0, math.sqrt(0.5)],
+                    "scale": [0.001, 0.001, 0.001],
+                }
+            ],
+            "meshes": [{"primitives": []}],
+            "materials": [],
+            "accessors": [],
+            "bufferViews": [],
+            "buffers": [],
+        }
+        for group in ("object", "support", "moves"):
+            if group == "moves" and not moves:
+                continue
+            mask = groups == group
+            if not mask.any():
+                continue
+            # LINES mode, each segment is a start/end vertex pair
+            vertices = np.empty((mask.sum() * 2, 3), dtype=np.float32)
+            vertices[0::2] = start[mask]
+            vertices[1::2] = end[mask]
+            data = vertices.tobytes()
+            index = len(gltf["accessors"])
+            gltf["bufferViews"].append(
+                {"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)}
+            )
+            gltf["accessors"].append(
+                {
+                    "bufferView": index,
+                    "componentType": 5126,  # float
+                    "count": len(vertices),
+                    "type": "VEC3",
+                    "min": vertices.min(axis=0).tolist(),
+                    "max": vertices.max(axis=0).tolist(),
+                }
+            )
+            gltf["materials"].append(
+                {
+                    "name": group,
+                    "pbrMetallicRoughness": {
+                        "baseColorFactor": list(GROUP_COLORS[group]) + [1.0]
+                    },
+                }
+            )
+            gltf["meshes"][0]["primitives"].append(
+                {
+                    "attributes": {"POSITION": index},
+                    "material": len(gltf["materials"]) - 1,
+                    "mode": 1,  # LINES
+                }
+            )
+            binary += data
+        gltf["buffers"].append({"byteLength": len(binary)})
+
+        # chunks are 4 byte aligned, JSON padded with spaces
+        header = json.dumps(gltf).encode()
+        header += b" " * (-len(header) % 4)
+        binary += b"\0" * (-len(binary) % 4)
+        with open(path, "wb") as f:
+            f.write(struct.pack("<III", 0x46546C67, 2, 28 + len(header) + len(binary)))
+            f.write(struct.pack("<II", len(header), 0x4E4F534A))
+            f.write(header)
+            f.write(struct.pack("<II", len(binary), 0x004E4942))
+            f.write(binary)
+
     def __str__(self):
         return (
             "<GcodeModel: len(segments)=%d, len(layers)=%d, distance=%f, extrudate=%f, bbox=%s>"
@@ -489,6 +944,10 @@ class Segment:
         self.coords = coords
         self.lineNb = lineNb
         self.line = line
+        self.feature = FEATURE_NONE
+        self.tool = 0
+        self.limits = DEFAULT_LIMITS
+        self.dwell = 0.0
         self.style = None
         self.layerIdx = 0
         self.distance = 0.0
@@ -496,9 +955,10 @@ class Segment:
 
     def __str__(self):
         return (
-            "<Segment: type=%s, lineNb=%d, style=%s, layerIdx=%d, distance=%f, extrudate=%f>"
+            "<Segment: type=%s, feature='%s', lineNb=%d, style=%s, layerIdx=%d, distance=%f, extrudate=%f>"
             % (
                 self.type,
+                FEATURE_NAMES[self.feature],
                 self.lineNb,
                 self.style,
                 self.layerIdx,
@@ -525,10 +985,428 @@ class Layer:
         )
 
 
+def loadArrays(path, mmap=True):
+    """Load toolpath arrays saved by GcodeModel.exportArrays
+
+    Columns of a directory export are memory mapped (read only) when mmap is
+    set, .npz files are always read fully. Feature codes are translated to
+    the feature codes of this process, so they can be used with FEATURE_NAMES
+    and FEATURE_GROUPS.
+
+    """
+    if os.path.isdir(path):
+        arrays = {
+            name[: -len(".npy")]: np.load(
+                os.path.join(path, name), mmap_mode="r" if mmap else None
+            )
+            for name in os.listdir(path)
+            if name.endswith(".npy")
+        }
+    else:
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+
+    if int(arrays["version"]) != ARRAYS_VERSION:
+        raise ValueError(
+            "unsupported toolpath arrays version %s" % int(arrays["version"])
+        )
+
+    codes = np.array([internFeature(name) for name in arrays["feature_names"]])
+    if len(codes) and not np.array_equal(codes, np.arange(len(codes))):
+        arrays["feature"] = codes[arrays["feature"]].astype(np.uint16)
+    arrays["feature_names"] = np.array(FEATURE_NAMES)
+    return arrays
+
+
+def estimatePrintTime(arrays, filamentDiameter=1.75, filamentDensity=1.24):
+    """Estimate print time and filament use from toolpath arrays (see toArrays)
+
+    Each move follows a trapezoidal velocity profile: feedrate F capped by
+    the axis max feedrates, the M204 acceleration of the move capped by the
+    axis max accelerations, and junction speeds limited by junction
+    deviation, or by jerk when the gcode sets classic jerk. The planner's
+    backward and forward passes are min-plus prefix scans, so everything is
+    vectorized over segments. Moves without length take no time, G4 dwell
+    is added and stops the machine.
+
+    Returns estimated_time (seconds), layer_time, segment_time and, with the
+    keys of readMetadata, filament_used_mm, filament_used_cm3 and
+    filament_used_g (filament diameter in mm, density in g/cm^3), plus
+    layer_filament (mm).
+
+    """
+    end = np.stack([arrays["x"], arrays["y"], arrays["z"], arrays["e"]], axis=1)
+    delta = np.diff(end, axis=0, prepend=np.zeros((1, 4)))
+    # X/Y/Z length, extruder only moves (retract, restore) use E length
+    length = np.asarray(arrays["distance"], dtype=np.float64)
+    extruderOnly = (length == 0) & (delta[:, 3] != 0)
+    length = np.where(extruderOnly, np.abs(delta[:, 3]), length)
+    moves = np.flatnonzero(length > 0)
+
+    segmentTime = np.asarray(arrays["dwell"], dtype=np.float64).copy()
+    if len(moves):
+        segmentTime[moves] += trapezoidTimes(arrays, moves, length, delta)
+    offsets = arrays["layer_offsets"]
+    if len(segmentTime):
+        layerTime = np.add.reduceat(segmentTime, offsets[:-1])
+    else:
+        layerTime = np.zeros(len(offsets) - 1)
+
+    filament = float(arrays["extrudate_total"])
+    volume = filament * math.pi * (filamentDiameter / 2.0) ** 2 / 1000.0
+    return {
+        "estimated_time": float(segmentTime.sum()),
+        "layer_time": layerTime,
+        "segment_time": segmentTime,
+        "filament_used_mm": filament,
+        "filament_used_cm3": volume,
+        "filament_used_g": volume * filamentDensity,
+        "layer_filament": np.asarray(arrays["layer_extrudate"]),
+    }
+
+
+def trapezoidTimes(arrays, moves, length, delta):
+    """Time of each move (segments with length), see estimatePrintTime"""
+    extruderOnly = arrays["distance"][moves] == 0
+    L = length[moves]
+    delta = delta[moves]
+    # fraction of the move length traveled by each axis
+    ratio = np.abs(delta) / L[:, None]
+    with np.errstate(divide="ignore"):
+        axisFeedrate = np.min(arrays["max_feedrate"] / ratio, axis=1)
+        axisAccel = np.min(arrays["max_accel"] / ratio, axis=1)
+    feedrate = arrays["f"][moves].astype(np.float64) / 60.0
+    feedrate[feedrate <= 0] = DEFAULT_FEEDRATE
+    v = np.minimum(feedrate, axisFeedrate)
+    a = np.minimum(arrays["accel"][moves].astype(np.float64), axisAccel)
+
+    # squared speed limit of the junctions between moves
+    unit = delta[:, :3] / L[:, None]
+    before, after = slice(None, -1), slice(1, None)
+    if arrays["classic_jerk"]:
+        # speed at which no axis changes its velocity by more than its jerk
+        change = np.abs(delta[after] / L[after, None] - delta[before] / L[before, None])
+        with np.errstate(divide="ignore"):
+            junction = np.min(arrays["jerk"] / change, axis=1) ** 2
+    else:
+        # speed on a circle deviating junction_deviation from the corner
+        cos = np.clip(-np.sum(unit[before] * unit[after], axis=1), -1.0, 1.0)
+        sin = np.sqrt(0.5 * (1.0 - cos))
+        with np.errstate(divide="ignore"):
+            junction = a[after] * arrays["junction_deviation"] * sin / (1.0 - sin)
+    junction = np.minimum(junction, np.minimum(v[before], v[after]) ** 2)
+    junction[extruderOnly[before] | extruderOnly[after]] = 0.0
+    # G4 waits for the planner to empty, the move before it ends at rest
+    dwelling = np.add.reduceat((arrays["dwell"] > 0).astype(np.int64), moves)
+    junction[dwelling[:-1] > 0] = 0.0
+    # print starts and ends at rest
+    limit = np.concatenate([[0.0], junction, [0.0]])
+
+    # planner passes: w[i] = min(limit[i], w[i-1] + 2aL), and backwards,
+    # unrolled to prefix sums of 2aL and a running minimum
+    reach = 2.0 * a * L
+    forward = np.concatenate([[0.0], np.cumsum(reach)])
+    forward = forward + np.minimum.accumulate(limit - forward)
+    backward = np.concatenate([np.cumsum(reach[::-1])[::-1], [0.0]])
+    backward = backward + np.minimum.accumulate((limit - backward)[::-1])[::-1]
+    speed = np.minimum(forward, backward)
+
+    # trapezoid: accelerate, cruise, decelerate (or triangle if too short)
+    start, stop = speed[:-1], speed[1:]
+    cruise = L - (2.0 * v**2 - start - stop) / (2.0 * a)
+    peak = np.where(
+        cruise > 0, v, np.sqrt(np.maximum(a * L + (start + stop) / 2.0, 0.0))
+    )
+    time = (2.0 * peak - np.sqrt(start) - np.sqrt(stop)) / a
+    return time + np.maximum(cruise, 0.0) / v
+
+
+# feature kinds reported by featureStats, first matching rule wins
+FEATURE_KIND_RES = [
+    ("bridge", re.compile(r"bridge")),
+    ("support", re.compile(r"support|interface")),
+    ("infill", re.compile(r"fill|skin|solid|top|bottom|ironing")),
+    ("perimeter", re.compile(r"perimeter|wall|external|overhang|shell")),
+]
+FEATURE_KINDS = [kind for kind, rex in FEATURE_KIND_RES] + ["other"]
+
+
+def featureKind(name):
+    """Return perimeter, infill, support, bridge or other for feature name"""
+    for kind, rex in FEATURE_KIND_RES:
+        if rex.search(name):
+            return kind
+    return "other"
+
+
+def featureStats(arrays, estimate=None, filamentDiameter=1.75):
+    """Per feature and per kind breakdown of toolpath arrays (see toArrays)
+
+    Sums segments in one group-by over feature and style codes. Features and
+    kinds (see featureKind) report extruding moves only: time (seconds),
+    distance (mm), filament_mm and filament_cm3. Travel is the fly style.
+    Retractions and restores count segments of those styles. Layer heights
+    are differences of the highest extruding Z of each layer (None for
+    layers without extrusion). Extrusion without feature type is reported
+    as feature unknown. estimate is the result of estimatePrintTime, computed
+    when not given.
+
+    Returns a dict of plain python values, ready for json.
+
+    """
+    if estimate is None:
+        estimate = estimatePrintTime(arrays)
+    styles = len(STYLE_NAMES)
+    names = arrays["feature_names"]
+    key = arrays["feature"].astype(np.int64) * styles + arrays["style"]
+    size = len(names) * styles
+
+    def group(weights=None):
+        return np.bincount(key, weights, minlength=size).reshape(-1, styles)
+
+    count = group()
+    time = group(estimate["segment_time"])
+    distance = group(arrays["distance"])
+    filament = group(arrays["extrudate"])
+    toVolume = math.pi * (filamentDiameter / 2.0) ** 2 / 1000.0
+
+    extrude = STYLE_CODES["extrude"]
+    features = {}
+    kinds = {
+        kind: {"time": 0.0, "distance": 0.0, "filament_mm": 0.0, "filament_cm3": 0.0}
+        for kind in FEATURE_KINDS
+    }
+    for code in np.flatnonzero(count[:, extrude]):
+        name = str(names[code]) or "unknown"
+        stats = {
+            "kind": featureKind(name),
+            "segments": int(count[code, extrude]),
+            "time": float(time[code, extrude]),
+            "distance": float(distance[code, extrude]),
+            "filament_mm": float(filament[code, extrude]),
+            "filament_cm3": float(filament[code, extrude]) * toVolume,
+        }
+        features[name] = stats
+        for column in kinds[stats["kind"]]:
+            kinds[stats["kind"]][column] += stats[column]
+
+    styleTotal = {
+        name: (int(count[:, code].sum()), float(distance[:, code].sum()))
+        for code, name in enumerate(STYLE_NAMES)
+    }
+    printDistance = styleTotal["extrude"][1]
+    travelDistance = styleTotal["fly"][1]
+    moved = printDistance + travelDistance
+
+    offsets = arrays["layer_offsets"]
+    heights = [None] * (len(offsets) - 1)
+    if len(key):
+        z = np.where(arrays["style"] == extrude, arrays["z"], -np.inf)
+        printZ = np.maximum.reduceat(z, offsets[:-1])
+        printed = np.flatnonzero(np.isfinite(printZ))
+        for layer, height in zip(printed, np.diff(printZ[printed], prepend=0.0)):
+            heights[layer] = round(float(height), 6)
+
+    return {
+        "segments": int(len(key)),
+        "layers": len(heights),
+        "estimated_time": estimate["estimated_time"],
+        "print_time": float(time[:, extrude].sum()),
+        "travel_time": float(time[:, STYLE_CODES["fly"]].sum()),
+        "filament_used_mm": estimate["filament_used_mm"],
+        "filament_used_cm3": estimate["filament_used_cm3"],
+        "print_distance": printDistance,
+        "travel_distance": travelDistance,
+        "travel_ratio": travelDistance / moved if moved else 0.0,
+        "retractions": styleTotal["retract"][0],
+        "restores": styleTotal["restore"][0],
+        "kinds": kinds,
+        "features": features,
+        "layer_heights": heights,
+    }
+
+
+# slicer summary comments, as written to header/footer by the slicers
+# key:value style (Cura, Simplify3D) and key = value style (PrusaSlicer, OrcaSlicer)
+# patterns are anchored on a literal newline (chunks are prefixed with one), which
+# lets the regex engine skip quickly over move lines
+METADATA_RE = re.compile(rb"\n;[ \t]*([A-Za-z][^:=\r\n]*)[:=]([^\r\n]*)")
+METADATA_GENERATOR_RE = re.compile(
+    rb"\n;[ \t]*(?:G-Code )?generated (?:by|with)[ \t]+"
+    rb"([^\r\n]+?)(?:[ \t]+on[ \t][^\r\n]*)?\r?\n",
+    re.I,
+)
+METADATA_THUMBNAIL_RE = re.compile(
+    rb"\n; thumbnail.*? begin.*?\n; thumbnail.*? end", re.S
+)
+DURATION_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(d|days?|h|hours?|m|mins?|minutes?|s|secs?|seconds?)\b"
+)
+NUMBER_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+
+# per layer/feature/object markers, not part of the summary
+METADATA_SKIP = ("layer", "type", "mesh", "time_elapsed", "height", "width", "z")
+METADATA_SKIP_PREFIXES = (
+    "setting_",
+    "generated",
+    "printing object",
+    "stop printing object",
+)
+
+# summary keys mapped to metadata fields, keys are lowercased comment keys
+METADATA_KEYS = {
+    "flavor": "flavor",
+    "gcode_flavor": "flavor",
+    "time": "estimated_time",
+    "estimated printing time (normal mode)": "estimated_time",
+    "estimated printing time": "estimated_time",
+    "total estimated time": "estimated_time",
+    "build time": "estimated_time",
+    "filament used": "filament_used_mm",
+    "filament used [mm]": "filament_used_mm",
+    "filament length": "filament_used_mm",
+    "filament used [cm3]": "filament_used_cm3",
+    "filament used [g]": "filament_used_g",
+    "total filament used [g]": "filament_used_g",
+    "plastic weight": "filament_used_g",
+    "layer_count": "layer_count",
+    "total layers count": "layer_count",
+    "total layer number": "layer_count",
+    "layer height": "layer_height",
+    "layer_height": "layer_height",
+    "max_layer_z": "max_z",
+    "filament_type": "filament_type",
+    "nozzle_diameter": "nozzle_diameter",
+    "printer_model": "printer_model",
+}
+
+
+def parseDuration(text):
+    """Convert slicer time string ('1h 2m 3s', '1 hours 2 minutes', '898') to seconds"""
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    matches = DURATION_RE.findall(text)
+    if not matches:
+        return None
+    return sum(float(value) * DURATION_UNITS[unit[0]] for value, unit in matches)
+
+
+def parseNumbers(text):
+    """Sum all numbers in comma separated value, used for multi extruder values"""
+    values = [float(v) for v in NUMBER_RE.findall(text.split("(")[0])]
+    return sum(values) if values else None
+
+
+def readMetadata(path, headSize=16384, tailSize=32768):
+    """Read slicer metadata from gcode header and footer comments
+
+    Only first headSize and last tailSize bytes of the file are read, moves are not parsed.
+
+    Returns dict with keys: slicer, flavor, estimated_time (seconds), filament_used_mm,
+    filament_used_cm3, filament_used_g, layer_count, layer_height, max_z, filament_type,
+    nozzle_diameter, printer_model, bbox ({'X': [min, max], ...}, if known) and
+    settings (all other summary comments as raw strings).
+
+    """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        if size <= headSize + tailSize:
+            chunks = [b"\n" + f.read()]
+        else:
+            head = f.read(headSize)
+            f.seek(-tailSize, 2)
+            tail = f.read()
+            # drop partial lines at chunk boundaries
+            chunks = [b"\n" + head[: head.rfind(b"\n") + 1], tail[tail.find(b"\n") :]]
+
+    metadata = {
+        "slicer": None,
+        "flavor": None,
+        "estimated_time": None,
+        "filament_used_mm": None,
+        "filament_used_cm3": None,
+        "filament_used_g": None,
+        "layer_count": None,
+        "layer_height": None,
+        "max_z": None,
+        "filament_type": None,
+        "nozzle_diameter": None,
+        "printer_model": None,
+        "bbox": None,
+        "settings": {},
+    }
+    settings = metadata["settings"]
+
+    # slicer name is always in the header
+    m = METADATA_GENERATOR_RE.search(chunks[0])
+    if m:
+        metadata["slicer"] = m.group(1).decode("utf-8", errors="replace").strip()
+
+    for chunk in chunks:
+        chunk = METADATA_THUMBNAIL_RE.sub(b"", chunk)
+        for m in METADATA_RE.finditer(chunk):
+            key = m.group(1).decode("utf-8", errors="replace").rstrip()
+            lkey = key.lower()
+            if lkey in METADATA_SKIP or lkey.startswith(METADATA_SKIP_PREFIXES):
+                continue
+            value = m.group(2).decode("utf-8", errors="replace").strip()
+            settings.setdefault(key, value)
+
+            if lkey in ("minx", "maxx", "miny", "maxy", "minz", "maxz"):
+                if metadata["bbox"] is None:
+                    metadata["bbox"] = {
+                        "X": [None, None],
+                        "Y": [None, None],
+                        "Z": [None, None],
+                    }
+                bounds = metadata["bbox"][lkey[3].upper()]
+                bounds[0 if lkey.startswith("min") else 1] = parseNumbers(value)
+                continue
+
+            field = METADATA_KEYS.get(lkey)
+            if field is None or metadata[field] is not None:
+                continue
+
+            if field == "estimated_time":
+                metadata[field] = parseDuration(value)
+            elif field == "filament_used_mm":
+                # Cura reports meters ('0.419796m'), Simplify3D mm ('1234.5 mm (1.2 m)')
+                number = parseNumbers(value)
+                if number is not None and re.fullmatch(r"(\s*[\d.]+m\s*,?)+", value):
+                    number *= 1000
+                metadata[field] = number
+            elif field == "layer_count":
+                number = parseNumbers(value)
+                metadata[field] = int(number) if number is not None else None
+            elif field in ("flavor", "filament_type", "printer_model"):
+                metadata[field] = value
+            else:
+                metadata[field] = parseNumbers(value)
+
+    return metadata
+
+
 if __name__ == "__main__":
-    path = "test.gcode"
+    # gcodeParser.py [file.gcode] [export.npz|export.glb|export_dir]
+    path = sys.argv[1] if len(sys.argv) > 1 else "test.gcode"
 
     parser = GcodeParser()
     model = parser.parseFile(path)
 
     print(model)
+    print(
+        "estimated time: %.0fs" % estimatePrintTime(model.toArrays())["estimated_time"]
+    )
+
+    if len(sys.argv) > 2:
+        if sys.argv[2].endswith(".glb"):
+            model.exportGltf(sys.argv[2])
+        else:
+            model.exportArrays(sys.argv[2])
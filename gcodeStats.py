@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import click
+import concurrent.futures
+import contextlib
+import csv
+import io
+import json
+import os
+import statistics
+import sys
+
+from gcodeParser import *
+
+# per file columns of csv output, per kind columns follow
+CSV_COLUMNS = [
+    "path",
+    "segments",
+    "layers",
+    "estimated_time",
+    "print_time",
+    "travel_time",
+    "filament_used_mm",
+    "filament_used_cm3",
+    "print_distance",
+    "travel_distance",
+    "travel_ratio",
+    "retractions",
+    "restores",
+    "first_layer_height",
+    "layer_height",
+]
+CSV_KIND_COLUMNS = ["time", "distance", "filament_mm", "filament_cm3"]
+
+
+def findSources(paths):
+    """Expand directories to the gcode files and toolpath exports inside"""
+    for path in paths:
+        if not os.path.isdir(path) or os.path.exists(os.path.join(path, "version.npy")):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            # directory exports are sources, not searched further
+            exports = [
+                name
+                for name in dirs
+                if os.path.exists(os.path.join(root, name, "version.npy"))
+            ]
+            for name in exports:
+                dirs.remove(name)
+            names = sorted(
+                exports + [name for name in files if name.endswith((".gcode", ".npz"))]
+            )
+            for name in names:
+                yield os.path.join(root, name)
+
+
+def fileStats(path):
+    """featureStats of gcode file or toolpath export, errors are reported"""
+    try:
+        if path.endswith(".gcode"):
+            # parser warnings would mix with the report on stdout
+            with contextlib.redirect_stdout(io.StringIO()):
+                arrays = GcodeParser().parseFile(path).toArrays()
+        else:
+            arrays = loadArrays(path)
+        return {"path": path, **featureStats(arrays)}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+
+def csvRow(stats):
+    """Flatten stats to csv row: per kind totals, first and median layer height"""
+    row = {column: stats.get(column) for column in CSV_COLUMNS}
+    for kind, values in stats.get("kinds", {}).items():
+        for column in CSV_KIND_COLUMNS:
+            row["%s_%s" % (kind, column)] = values[column]
+    heights = [height for height in stats.get("layer_heights", []) if height]
+    if heights:
+        row["first_layer_height"] = heights[0]
+        row["layer_height"] = statistics.median(heights[1:] or heights)
+    row["error"] = stats.get("error")
+    return row
+
+
+@click.command()
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["json", "csv"]),
+    default="json",
+    help="json: one object per file and line, csv: one row per file",
+)
+@click.option(
+    "--jobs",
+    default=os.cpu_count(),
+    help="Files processed in parallel",
+)
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+def gcodeStats(fmt, jobs, paths):
+    """Per feature statistics of gcode files, directories are searched
+
+    Reports estimated time, filament and distance per feature and per kind
+    (perimeter, infill, support, bridge, other), travel distance and ratio,
+    retraction counts and layer heights. Toolpath exports (.npz or
+    directory, see gcodeParser.py) are read as well.
+
+    """
+    sources = list(findSources(paths))
+    if jobs > 1 and len(sources) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        results = executor.map(fileStats, sources)
+    else:
+        executor = contextlib.nullcontext()
+        results = map(fileStats, sources)
+
+    with executor:
+        if fmt == "csv":
+            columns = CSV_COLUMNS + [
+                "%s_%s" % (kind, column)
+                for kind in FEATURE_KINDS
+                for column in CSV_KIND_COLUMNS
+            ]
+            writer = csv.DictWriter(sys.stdout, columns + ["error"])
+            writer.writeheader()
+            for stats in results:
+                writer.writerow(csvRow(stats))
+        else:
+            for stats in results:
+                click.echo(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    gcodeStats()
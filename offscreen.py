@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import ctypes.util
+import os
+
+# VTK render windows without X server: OSMesa renders in software, EGL on the
+# GPU or in software through Mesa
+OSMESA_WINDOW = "vtkOSOpenGLRenderWindow"
+EGL_WINDOW = "vtkEGLRenderWindow"
+X_WINDOW = "vtkXOpenGLRenderWindow"
+# backend -> render window class and the library it loads at runtime
+WINDOWS = {"osmesa": (OSMESA_WINDOW, "OSMesa"), "egl": (EGL_WINDOW, "EGL")}
+
+
+def hasWindow(backend):
+    """True if this VTK can render through the window of backend (osmesa, egl)
+
+    Either VTK is built for that window only (vtk-osmesa wheel, no X window
+    class), or it selects the window at runtime (VTK 9.4+) and the library is
+    installed. No render window is created, it would look for an X server.
+
+    """
+    window, library = WINDOWS[backend]
+    try:
+        import vtkmodules.vtkRenderingOpenGL2 as opengl
+    except ImportError:
+        return False
+
+    if not hasattr(opengl, window):
+        return False
+    return not hasattr(opengl, X_WINDOW) or bool(ctypes.util.find_library(library))
+
+
+def selectBackend():
+    """Choose render backend before mayavi is imported, return osmesa, egl or x
+
+    GCODE2PNG_BACKEND=osmesa|egl|x forces the backend. Otherwise the X server
+    of DISPLAY (desktop or Xvfb) is used, which also allows preview windows.
+    Without DISPLAY, OSMesa is used when VTK supports it, then EGL, and X as
+    the last resort.
+
+    """
+    backend = os.environ.get("GCODE2PNG_BACKEND", "auto")
+    if backend == "auto":
+        backend = "x"
+        if not os.environ.get("DISPLAY"):
+            backend = next((name for name in WINDOWS if hasWindow(name)), "x")
+    if backend in WINDOWS:
+        # runtime window selection of VTK 9.4+, ignored by single window builds
+        os.environ.setdefault("VTK_DEFAULT_OPENGL_WINDOW", WINDOWS[backend][0])
+        # no GUI toolkit for traits, it would need an X server
+        os.environ.setdefault("ETS_TOOLKIT", "null")
+    return backend
+
+
+if __name__ == "__main__":
+    # prints backend gcode2png would use, e.g. to start Xvfb only when needed
+    print(selectBackend())
@@ -0,0 +1,114 @@
+import contextlib
+import glob
+import io
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+import pytest
+
+from gcodeParser import GcodeParser
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+GCODES = sorted(glob.glob(os.path.join(TESTS, "*.gcode")))
+# expected images and metrics, apart from tests/*.png written by make
+GOLDEN = os.path.join(TESTS, "golden")
+
+
+def goldenPath(path, suffix):
+    """Golden file of a tests/*.gcode file, e.g. golden/2.metrics.json"""
+    name = os.path.basename(path)[: -len(".gcode")]
+    return os.path.join(GOLDEN, name + suffix)
+
+
+def parseGcode(tmp_path, text, **kwargs):
+    """Parse inline gcode, given as lines of text"""
+    path = tmp_path / "inline.gcode"
+    path.write_text(text)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return GcodeParser(**kwargs).parseFile(str(path))
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-goldens",
+        action="store_true",
+        help="Rewrite golden images and metrics instead of comparing",
+    )
+    parser.addoption(
+        "--ssim",
+        type=float,
+        default=0.98,
+        help="Minimal structural similarity of render and golden image",
+    )
+    parser.addoption("--perf-json", help="Write render time and memory to file")
+
+
+def pytest_configure(config):
+    config.perfRecords = []
+
+
+@pytest.fixture
+def updateGoldens(request):
+    return request.config.getoption("--update-goldens")
+
+
+@pytest.fixture
+def perf(request):
+    """Run func of a case twice: timed, then traced for peak memory
+
+    Returns result of the timed run. Tracing slows python down several
+    times, so it never runs inside the timed run.
+
+    """
+    records = request.config.perfRecords
+
+    def measure(func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            func()
+            # python and numpy allocations only, VTK memory is not traced
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        record = {
+            "test": request.node.nodeid,
+            "seconds": elapsed,
+            "peak_traced_mb": peak / 2**20,
+            # high-water mark of the whole test process, not of this case
+            "process_maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / 2**10,
+        }
+        records.append(record)
+        for name, value in record.items():
+            request.node.user_properties.append((name, value))
+        return result
+
+    return measure
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not config.perfRecords:
+        return
+    terminalreporter.section("time and peak memory")
+    for record in config.perfRecords:
+        terminalreporter.write_line(
+            "%8.3fs %8.1f MB traced %8.1f MB process maxrss  %s"
+            % (
+                record["seconds"],
+                record["peak_traced_mb"],
+                record["process_maxrss_mb"],
+                record["test"],
+            )
+        )
+    path = config.getoption("--perf-json")
+    if path:
+        with open(path, "w") as f:
+            json.dump(config.perfRecords, f, indent=1)
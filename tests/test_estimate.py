@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from conftest import parseGcode
+from gcodeParser import *
+
+
+def estimate(tmp_path, text):
+    return estimatePrintTime(parseGcode(tmp_path, text).toArrays())
+
+
+def trapezoid(L, v, a, start=0.0, stop=0.0):
+    """Reference time of one move, accelerating from start and to stop speed"""
+    accel = (v * v - start * start) / (2 * a)
+    decel = (v * v - stop * stop) / (2 * a)
+    if accel + decel <= L:
+        return (v - start) / a + (v - stop) / a + (L - accel - decel) / v
+    peak = math.sqrt(a * L + (start * start + stop * stop) / 2)
+    return (peak - start) / a + (peak - stop) / a
+
+
+def test_long_move(tmp_path):
+    # 100mm at 50mm/s and 1000mm/s^2: cruise time plus v/a lost to ramps
+    result = estimate(tmp_path, "M204 T1000\nG1 X100 F3000\n")
+    assert result["estimated_time"] == pytest.approx(100 / 50 + 50 / 1000)
+
+
+def test_triangle_profile(tmp_path):
+    # 1mm is too short to reach 50mm/s, peak speed is sqrt(a * L)
+    result = estimate(tmp_path, "M204 T1000\nG1 X1 F3000\n")
+    assert result["estimated_time"] == pytest.approx(2 * math.sqrt(1 / 1000))
+    assert result["estimated_time"] == pytest.approx(trapezoid(1, 50, 1000))
+
+
+@pytest.mark.parametrize(
+    "limits, junction",
+    [
+        # junction deviation: sqrt(a * J * sin(90/2) / (1 - sin(90/2)))
+        ("M205 J0.05", math.sqrt(1000 * 0.05 * math.sqrt(0.5) / (1 - math.sqrt(0.5)))),
+        # classic jerk: X velocity drops by v and Y rises by v, both up to 8mm/s
+        ("M205 X8 Y8", 8.0),
+    ],
+)
+def test_corner(tmp_path, limits, junction):
+    result = estimate(tmp_path, "M204 T1000\n%s\nG1 X100 F3000\nG1 Y100\n" % limits)
+    expected = trapezoid(100, 50, 1000, stop=junction)
+    assert result["segment_time"] == pytest.approx([expected, expected])
+
+
+def test_dwell(tmp_path):
+    moves = "M204 T1000\nG1 X10 F3000\n%sG1 X20\n"
+    plain = estimate(tmp_path, moves % "")
+    dwell = estimate(tmp_path, moves % "G4 P500\nG4 S1\n")
+    # dwell is added to the move before it, which stops instead of going on
+    expected = trapezoid(10, 50, 1000)
+    assert dwell["segment_time"] == pytest.approx([expected + 1.5, expected])
+    assert plain["estimated_time"] == pytest.approx(trapezoid(20, 50, 1000))
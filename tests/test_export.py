@@ -0,0 +1,100 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import gcodeParser
+from conftest import parseGcode
+from gcodeParser import *
+
+GCODE = """\
+;LAYER:0
+;TYPE:WALL-OUTER
+G1 X10 Y0 Z0.2 E1 F1200
+G1 X10 Y10 E2
+;TYPE:SUPPORT
+G1 X0 Y10 E3
+G0 X0 Y0
+;LAYER:1
+;TYPE:FILL
+G1 X5 Y5 Z0.4 E4
+G0 X10 Y10
+"""
+
+
+@pytest.fixture
+def model(tmp_path):
+    return parseGcode(tmp_path, GCODE)
+
+
+def assertArraysEqual(loaded, arrays):
+    assert set(loaded) == set(arrays)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array, err_msg=name)
+
+
+@pytest.mark.parametrize("name", ["export.npz", "export"])
+def test_arrays_round_trip(tmp_path, model, name):
+    path = str(tmp_path / name)
+    model.exportArrays(path)
+    assertArraysEqual(loadArrays(path), model.toArrays())
+
+
+def test_arrays_feature_codes(tmp_path, model, monkeypatch):
+    path = str(tmp_path / "export.npz")
+    model.exportArrays(path)
+    arrays = model.toArrays()
+    names = arrays["feature_names"][arrays["feature"]]
+    groups = segmentGroups(arrays)
+
+    # another process, which interned other feature names first
+    monkeypatch.setattr(gcodeParser, "FEATURE_NAMES", ["", "skirt", "fill"])
+    monkeypatch.setattr(gcodeParser, "FEATURE_GROUPS", ["moves", "support", "object"])
+    monkeypatch.setattr(gcodeParser, "FEATURE_CODES", {"": 0, "skirt": 1, "fill": 2})
+    loaded = loadArrays(path)
+    assert loaded["feature_names"].tolist() == gcodeParser.FEATURE_NAMES
+    np.testing.assert_array_equal(loaded["feature_names"][loaded["feature"]], names)
+    np.testing.assert_array_equal(segmentGroups(loaded), groups)
+
+
+def test_segment_groups(model):
+    groups = segmentGroups(model.toArrays())
+    # travel of object is a move, travel of support is still support
+    assert groups.tolist() == [
+        "object",
+        "object",
+        "support",
+        "support",
+        "object",
+        "moves",
+    ]
+
+
+def test_gltf(tmp_path, model):
+    path = tmp_path / "export.glb"
+    model.exportGltf(str(path), moves=True)
+    data = path.read_bytes()
+
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    assert (magic, version, length) == (0x46546C67, 2, len(data))
+    jsonLength, jsonType = struct.unpack_from("<II", data, 12)
+    assert jsonType == 0x4E4F534A and jsonLength % 4 == 0
+    gltf = json.loads(data[20 : 20 + jsonLength])
+    binOffset = 20 + jsonLength
+    binLength, binType = struct.unpack_from("<II", data, binOffset)
+    assert binType == 0x004E4942 and binLength % 4 == 0
+    assert binOffset + 8 + binLength == len(data)
+    assert gltf["buffers"][0]["byteLength"] <= binLength
+
+    groups = segmentGroups(model.toArrays())
+    for primitive in gltf["meshes"][0]["primitives"]:
+        accessor = gltf["accessors"][primitive["attributes"]["POSITION"]]
+        view = gltf["bufferViews"][accessor["bufferView"]]
+        material = gltf["materials"][primitive["material"]]
+        # start and end vertex of each segment, 3 floats each
+        assert accessor["count"] == 2 * (groups == material["name"]).sum()
+        assert view["byteLength"] == accessor["count"] * 12
+        assert view["byteOffset"] + view["byteLength"] <= binLength
+        color = material["pbrMetallicRoughness"]["baseColorFactor"]
+        assert color == list(GROUP_COLORS[material["name"]]) + [1.0]
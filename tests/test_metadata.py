@@ -0,0 +1,105 @@
+import pytest
+
+from gcodeParser import *
+
+CURA = """\
+;FLAVOR:Marlin
+;TIME:6613
+;Filament used: 0.4m
+;Layer height: 0.2
+;MINX:10.5
+;MAXX:60
+;Generated with Cura_SteamEngine 5.2.1
+;LAYER_COUNT:2
+;LAYER:0
+;TYPE:WALL-OUTER
+;MESH:cube.stl
+G1 X10 Y10 E1
+;TIME_ELAPSED:12.5
+;LAYER:1
+G1 X20 Y20 E2
+"""
+
+PRUSA = """\
+; generated by PrusaSlicer 2.6.0+win64 on 2023-07-10 at 10:00:00 UTC
+;LAYER_CHANGE
+;Z:0.2
+;HEIGHT:0.2
+; printing object cube.stl id:0 copy 0
+;TYPE:Perimeter
+;WIDTH:0.45
+G1 X10 Y10 E1
+; stop printing object cube.stl id:0 copy 0
+; filament used [mm] = 1234.56
+; filament used [cm3] = 2.97
+; filament used [g] = 3.68
+; estimated printing time (normal mode) = 1h 2m 3s
+; filament_type = PETG
+; nozzle_diameter = 0.4
+; printer_model = MINI
+"""
+
+
+def metadata(tmp_path, text, newline="\n", **kwargs):
+    path = tmp_path / "metadata.gcode"
+    path.write_bytes(text.replace("\n", newline).encode())
+    return readMetadata(str(path), **kwargs)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_cura(tmp_path, newline):
+    result = metadata(tmp_path, CURA, newline)
+    assert result["slicer"] == "Cura_SteamEngine 5.2.1"
+    assert result["flavor"] == "Marlin"
+    assert result["estimated_time"] == 6613
+    # Cura reports meters
+    assert result["filament_used_mm"] == pytest.approx(400)
+    assert result["layer_height"] == 0.2
+    assert result["layer_count"] == 2
+    assert result["bbox"] == {"X": [10.5, 60.0], "Y": [None, None], "Z": [None, None]}
+    # per layer and feature markers are not settings
+    assert set(result["settings"]) == {
+        "FLAVOR",
+        "TIME",
+        "Filament used",
+        "Layer height",
+        "MINX",
+        "MAXX",
+        "LAYER_COUNT",
+    }
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_prusaslicer(tmp_path, newline):
+    result = metadata(tmp_path, PRUSA, newline)
+    assert result["slicer"] == "PrusaSlicer 2.6.0+win64"
+    assert result["estimated_time"] == 3723
+    assert result["filament_used_mm"] == 1234.56
+    assert result["filament_used_cm3"] == 2.97
+    assert result["filament_used_g"] == 3.68
+    assert result["filament_type"] == "PETG"
+    assert result["nozzle_diameter"] == 0.4
+    assert result["printer_model"] == "MINI"
+    # neither object markers nor Z of layer changes
+    assert set(result["settings"]) == {
+        "filament used [mm]",
+        "filament used [cm3]",
+        "filament used [g]",
+        "estimated printing time (normal mode)",
+        "filament_type",
+        "nozzle_diameter",
+        "printer_model",
+    }
+
+
+def test_head_and_tail_only(tmp_path):
+    header, footer = PRUSA.split("; filament used [mm]")
+    moves = "G1 X10 Y10 E1\n" * 1000
+    text = header + moves + "; middle = 1\n" + moves + "; filament used [mm]" + footer
+    result = metadata(tmp_path, text, headSize=1024, tailSize=1024)
+    assert len(text) > 2048
+    assert result["slicer"] == "PrusaSlicer 2.6.0+win64"
+    assert result["estimated_time"] == 3723
+    assert result["filament_used_mm"] == 1234.56
+    # middle of the file is not read
+    assert "middle" not in result["settings"]
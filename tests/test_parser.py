@@ -0,0 +1,106 @@
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+from conftest import GCODES, goldenPath, parseGcode
+from gcodeParser import *
+
+
+def modelMetrics(model):
+    """GcodeModel metrics compared exactly with the golden ones"""
+    arrays = model.toArrays()
+    return {
+        "segments": len(model.segments),
+        "layers": len(model.layers),
+        "distance": model.distance,
+        "extrudate": model.extrudate,
+        "bbox": arrays["bbox"].tolist(),
+        "layer_z": arrays["layer_z"].tolist(),
+        "layer_distance": arrays["layer_distance"].tolist(),
+        "layer_extrudate": arrays["layer_extrudate"].tolist(),
+        "features": {
+            str(arrays["feature_names"][code]): int(count)
+            for code, count in enumerate(np.bincount(arrays["feature"]))
+            if count
+        },
+        "styles": {
+            STYLE_NAMES[code]: int(count)
+            for code, count in enumerate(np.bincount(arrays["style"]))
+            if count
+        },
+    }
+
+
+@pytest.mark.parametrize("path", GCODES, ids=os.path.basename)
+def test_metrics(path, perf, updateGoldens):
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = perf(lambda: GcodeParser().parseFile(path))
+    metrics = modelMetrics(model)
+
+    golden = goldenPath(path, ".metrics.json")
+    if updateGoldens:
+        os.makedirs(os.path.dirname(golden), exist_ok=True)
+        with open(golden, "w") as f:
+            json.dump(metrics, f, indent=1)
+            f.write("\n")
+    with open(golden) as f:
+        assert metrics == json.load(f)
+
+
+def test_relative_extrusion(tmp_path):
+    model = parseGcode(tmp_path, "M83\nG1 X10 E1\nG1 X20 E1\nM82\nG1 X30 E5\n")
+    assert [seg.coords["E"] for seg in model.segments] == [1.0, 2.0, 5.0]
+
+
+@pytest.mark.parametrize("firmware, e", [("marlin", 2.0), ("reprap", 3.0)])
+def test_absolute_positioning_extruder_mode(tmp_path, firmware, e):
+    model = parseGcode(tmp_path, "M83\nG1 X10 E1\nG90\nG1 X20 E2\n", firmware=firmware)
+    assert model.segments[-1].coords["E"] == e
+
+
+def test_inches(tmp_path):
+    model = parseGcode(tmp_path, "G20\nG1 X1 Y2 E0.5 F60\nG21\nG1 X30\n")
+    first, second = model.segments
+    assert (first.coords["X"], first.coords["Y"]) == (25.4, 50.8)
+    assert (first.coords["E"], first.coords["F"]) == (12.7, 1524.0)
+    assert second.coords["X"] == 30.0
+
+
+def test_home(tmp_path):
+    model = parseGcode(tmp_path, "G92 X5\nG1 X10 Y10 Z1\nG28 X\nG28\n")
+    moved, homeX, homeAll = model.segments
+    assert moved.coords["X"] == 5.0
+    assert homeX.type == "G28"
+    assert (homeX.coords["X"], homeX.coords["Y"], homeX.coords["Z"]) == (0, 10, 1)
+    assert (homeAll.coords["X"], homeAll.coords["Y"], homeAll.coords["Z"]) == (0, 0, 0)
+
+
+def test_tool_change(tmp_path):
+    model = parseGcode(tmp_path, "G1 X1 E1\nT1\nG1 X2 E2\nT0\nG1 X3 E3\n")
+    assert [seg.tool for seg in model.segments] == [0, 1, 0]
+
+
+@pytest.mark.parametrize(
+    "comment, feature",
+    [
+        (";TYPE:WALL-OUTER", "wall-outer"),  # Cura, PrusaSlicer
+        ("; FEATURE: Outer wall", "outer wall"),  # OrcaSlicer
+        ("; feature outer perimeter", "outer perimeter"),  # Simplify3D
+        ("; skirt", "skirt"),  # older slicers
+        ("; infill extrusion width = 0.45mm", ""),  # setting, not a marker
+    ],
+)
+def test_feature_comments(tmp_path, comment, feature):
+    model = parseGcode(tmp_path, "%s\nG1 X10 E1\n" % comment)
+    assert FEATURE_NAMES[model.segments[0].feature] == feature
+
+
+def test_negative_layer(tmp_path):
+    # raft layers of Cura are numbered below zero
+    model = parseGcode(
+        tmp_path, ";LAYER:-2\nG1 X10 Z0.3 E1\n;LAYER:0\nG1 X20 Z0.5 E2\n"
+    )
+    assert [seg.layerIdx for seg in model.segments] == [-2, 0]
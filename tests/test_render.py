@@ -0,0 +1,116 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from conftest import GCODES, goldenPath
+
+mlab = pytest.importorskip("mayavi.mlab")
+from tvtk.api import tvtk
+
+import gcode2png
+from gcode2png import GcodeRenderer
+
+# golden name suffix -> renderer options, as the Makefile renders them
+VARIANTS = {
+    "": dict(support=False, moves=False, imgx=1600, imgy=1200),
+    ".moves": dict(support=False, moves=True, imgx=1600, imgy=1200),
+    ".supports": dict(support=True, moves=False, imgx=1600, imgy=1200),
+    ".all": dict(support=True, moves=True, imgx=1600, imgy=1200),
+    ".512": dict(support=False, moves=False, imgx=512, imgy=512),
+}
+
+
+def readPng(path):
+    """PNG file as (height, width, 3) uint8 RGB array, top row first"""
+    reader = tvtk.PNGReader(file_name=path)
+    reader.update()
+    image = reader.output
+    width, height, _ = image.dimensions
+    pixels = image.point_data.scalars.to_array().reshape(height, width, -1)
+    return pixels[::-1, :, :3]
+
+
+def boxFilter(image, size):
+    """Mean over size x size windows (valid part only), via summed area table"""
+    table = np.pad(image.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (
+        table[size:, size:]
+        - table[:-size, size:]
+        - table[size:, :-size]
+        + table[:-size, :-size]
+    ) / size**2
+
+
+def ssim(a, b, size=8):
+    """Mean structural similarity of two RGB images, on luma"""
+    weights = np.array([0.299, 0.587, 0.114])
+    a = a.astype(np.float64) @ weights
+    b = b.astype(np.float64) @ weights
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ma, mb = boxFilter(a, size), boxFilter(b, size)
+    va = boxFilter(a * a, size) - ma * ma
+    vb = boxFilter(b * b, size) - mb * mb
+    cov = boxFilter(a * b, size) - ma * mb
+    index = ((2 * ma * mb + c1) * (2 * cov + c2)) / (
+        (ma * ma + mb * mb + c1) * (va + vb + c2)
+    )
+    return float(index.mean())
+
+
+def cases():
+    for path in GCODES:
+        for suffix, options in VARIANTS.items():
+            golden = goldenPath(path, suffix + ".png")
+            yield pytest.param(path, golden, options, id=os.path.basename(golden))
+
+
+@pytest.mark.parametrize("path, golden, options", list(cases()))
+def test_render(path, golden, options, perf, updateGoldens, request):
+    if not updateGoldens and not os.path.exists(golden):
+        pytest.skip("no golden image, render it with --update-goldens")
+    os.makedirs(os.path.dirname(golden), exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        images = perf(
+            lambda: GcodeRenderer().run(
+                path=path,
+                bed=True,
+                show=False,
+                target=golden if updateGoldens else None,
+                output=None if updateGoldens else "array",
+                **options
+            )
+        )
+    if updateGoldens:
+        return
+
+    image = images[("iso", (options["imgx"], options["imgy"]))]
+    expected = readPng(golden)
+    assert image.shape == expected.shape
+    assert ssim(image, expected) >= request.config.getoption("--ssim")
+
+
+def test_render_twice():
+    path = GCODES[0]
+    renderer = GcodeRenderer()
+    options = dict(VARIANTS[".512"], bed=False, show=False, target=None, output="array")
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = renderer.run(path=path, **options)
+        second = renderer.run(path=path, **options)
+    key = ("iso", (512, 512))
+    assert renderer.plots == ["object"]
+    assert second[key].shape == first[key].shape
+    assert ssim(second[key], first[key]) >= 0.99
+
+
+def test_webp_without_pillow(monkeypatch):
+    monkeypatch.setattr(gcode2png, "Image", None)
+    result = CliRunner().invoke(
+        gcode2png.gcode2png, ["--format", "webp", GCODES[0], "-"]
+    )
+    # refused before rendering
+    assert result.exit_code == 2
+    assert "needs Pillow" in result.output
@@ -0,0 +1,106 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from conftest import GCODES, parseGcode
+from gcodeParser import *
+from gcodeStats import csvRow, findSources, gcodeStats
+
+GCODE = """\
+;LAYER:0
+;TYPE:WALL-OUTER
+G1 X10 Y0 Z0.2 E1 F1200
+;TYPE:FILL
+G1 X10 Y10 E2
+G1 E1.5
+G0 X0 Y0
+G1 E2
+;LAYER:1
+;TYPE:WALL-OUTER
+G1 X10 Y0 Z0.4 E3
+"""
+
+
+def stats(tmp_path, text):
+    return featureStats(parseGcode(tmp_path, text).toArrays())
+
+
+def test_feature_stats(tmp_path):
+    result = stats(tmp_path, GCODE)
+    assert set(result["features"]) == {"wall-outer", "fill"}
+    assert result["features"]["wall-outer"]["segments"] == 2
+    assert result["features"]["fill"]["distance"] == pytest.approx(10)
+    # both walls also rise by 0.2mm
+    assert result["kinds"]["perimeter"]["distance"] == pytest.approx(
+        2 * math.hypot(10, 0.2)
+    )
+    assert result["kinds"]["infill"]["filament_mm"] == pytest.approx(1)
+    assert result["travel_distance"] == pytest.approx(math.hypot(10, 10))
+    assert (result["retractions"], result["restores"]) == (1, 1)
+    assert result["layer_heights"] == [0.2, 0.2]
+    # extruding time of features adds up to print time
+    total = sum(feature["time"] for feature in result["features"].values())
+    assert total == pytest.approx(result["print_time"])
+    json.dumps(result)
+
+
+def test_feature_stats_untyped(tmp_path):
+    result = stats(tmp_path, "; infill extrusion width = 0.45mm\nG1 X10 E1 F1200\n")
+    assert set(result["features"]) == {"unknown"}
+    assert result["features"]["unknown"]["kind"] == "other"
+    assert result["kinds"]["infill"]["distance"] == 0
+
+
+def test_find_sources(tmp_path):
+    for name in ("b.gcode", "a.npz", "notes.txt", "sub/c.gcode"):
+        os.makedirs(os.path.dirname(tmp_path / name), exist_ok=True)
+        (tmp_path / name).write_text("")
+    export = tmp_path / "export"
+    os.makedirs(export / "nested")
+    np.save(export / "version.npy", np.array(ARRAYS_VERSION))
+    (export / "nested" / "d.gcode").write_text("")
+
+    sources = [os.path.relpath(p, tmp_path) for p in findSources([str(tmp_path)])]
+    # export directories are sources, not searched further
+    assert sources == ["a.npz", "b.gcode", "export", os.path.join("sub", "c.gcode")]
+    assert list(findSources([str(export)])) == [str(export)]
+
+
+def test_csv_row():
+    row = csvRow(
+        {
+            "path": "a.gcode",
+            "segments": 10,
+            "kinds": {
+                "infill": {
+                    "time": 1.0,
+                    "distance": 2.0,
+                    "filament_mm": 3.0,
+                    "filament_cm3": 0.5,
+                }
+            },
+            "layer_heights": [0.3, None, 0.2, 0.2, 0.25],
+        }
+    )
+    assert row["path"] == "a.gcode" and row["segments"] == 10
+    assert row["infill_time"] == 1.0 and row["infill_filament_mm"] == 3.0
+    assert (row["first_layer_height"], row["layer_height"]) == (0.3, 0.2)
+    assert row["estimated_time"] is None and row["error"] is None
+
+
+@pytest.mark.parametrize("fmt", ["json", "csv"])
+def test_parallel(tmp_path, fmt):
+    path = tmp_path / "broken.npz"
+    path.write_text("not an export")
+    paths = GCODES[:2] + [str(path)]
+    runner = CliRunner()
+    serial = runner.invoke(gcodeStats, ["--format", fmt, "--jobs", "1"] + paths)
+    parallel = runner.invoke(gcodeStats, ["--format", fmt, "--jobs", "2"] + paths)
+    assert serial.exit_code == 0 and parallel.exit_code == 0
+    # same results in input order, errors reported per file
+    assert parallel.output == serial.output
+    assert len(parallel.output.splitlines()) == 3 + (fmt == "csv")
+    assert "broken.npz" in parallel.output.splitlines()[-1]